@@ -0,0 +1,61 @@
+"""
+Fetch a filtered catalog page with a linear scan and with the genre/year posting lists.
+
+    python -m benchmarks.bench_catalog_filter
+"""
+
+import random
+import timeit
+
+from lib.catalog_cache import PAGE_SIZE
+from lib.catalog_index import CatalogIndex, matches_filter
+from lib.model.catalog_type import CatalogType
+from lib.providers.catalog_info import ImdbInfo
+
+GENRES = [
+    "Action",
+    "Adventure",
+    "Animation",
+    "Comedy",
+    "Crime",
+    "Drama",
+    "Family",
+    "Horror",
+    "Romance",
+    "Sci-Fi",
+]
+
+
+def build_catalog(size: int) -> list[ImdbInfo]:
+    rng = random.Random(size)
+    return [
+        ImdbInfo(f"tt{idx:07d}", CatalogType.MOVIES, rng.sample(GENRES, 3), str(rng.randint(1990, 2024)))
+        for idx in range(size)
+    ]
+
+
+def scan(items: list[ImdbInfo], filters: tuple[str, ...], skip: int) -> list[ImdbInfo]:
+    matching = [item for item in items if all(matches_filter(item, key) for key in filters)]
+    return matching[skip : skip + PAGE_SIZE]
+
+
+def main():
+    print(f"{'items':>7} {'filters':<18} {'scan':>10} {'index':>10}")
+    for size in (1000, 10000, 100000):
+        items = build_catalog(size)
+        index = CatalogIndex(items)
+        for filters in (("Drama",), ("2010",), ("Comedy", "Drama")):
+            assert scan(items, filters, PAGE_SIZE) == index.page(filters, PAGE_SIZE)
+            number = max(1, 200000 // size)
+            linear = (
+                min(timeit.repeat(lambda: scan(items, filters, PAGE_SIZE), number=number, repeat=3)) / number
+            )
+            indexed = (
+                min(timeit.repeat(lambda: index.page(filters, PAGE_SIZE), number=number, repeat=3)) / number
+            )
+            label = ",".join(filters)
+            print(f"{size:>7} {label:<18} {linear * 1e6:>7.0f} us {indexed * 1e6:>7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
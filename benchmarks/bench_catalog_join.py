@@ -0,0 +1,62 @@
+"""
+Join cached metas to catalog items with the former nested loops and with the id index.
+
+    python -m benchmarks.bench_catalog_join
+"""
+
+import timeit
+
+from lib.catalog_cache import index_metas, order_metas
+from lib.model.catalog_type import CatalogType
+from lib.providers.catalog_info import ImdbInfo
+
+
+def build_page(size: int) -> tuple[list[ImdbInfo], dict[str, dict]]:
+    items = [ImdbInfo(f"tt{idx:07d}", CatalogType.MOVIES, ["Drama"], "2021") for idx in range(size)]
+    cache = {item.id: {"id": item.id, "type": "movie", "name": f"Movie {item.id}"} for item in items}
+    return items, cache
+
+
+def join_nested(items: list[ImdbInfo], cache: dict[str, dict]) -> list[dict]:
+    metas = [cache[item.id] for item in items]
+
+    new_cached_metas = {}
+    for meta in metas:
+        meta_id = meta.get("id") or None
+        if meta_id is None:
+            continue
+        for item in items:
+            if isinstance(item, ImdbInfo) and item.id == meta_id:
+                new_cached_metas.update({item.id: meta})
+                break
+    cache.update(new_cached_metas)
+
+    sorted_metas = []
+    for item in items:
+        if not isinstance(item, ImdbInfo):
+            continue
+        for meta in metas:
+            if meta.get("id") == item.id:
+                sorted_metas.append(meta)
+                break
+    return sorted_metas
+
+
+def join_indexed(items: list[ImdbInfo], cache: dict[str, dict]) -> list[dict]:
+    metas = [cache[item.id] for item in items]
+    return order_metas(items, index_metas(metas))
+
+
+def main():
+    print(f"{'items':>6} {'nested loops':>14} {'id index':>12}")
+    for size in (25, 100, 1000):
+        items, cache = build_page(size)
+        assert join_nested(items, cache) == join_indexed(items, cache)
+        number = max(1, 20000 // size)
+        nested = min(timeit.repeat(lambda: join_nested(items, cache), number=number, repeat=5)) / number
+        indexed = min(timeit.repeat(lambda: join_indexed(items, cache), number=number, repeat=5)) / number
+        print(f"{size:>6} {nested * 1e6:>11.1f} us {indexed * 1e6:>9.1f} us ({nested / indexed:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
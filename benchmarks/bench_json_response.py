@@ -0,0 +1,69 @@
+"""
+Serialize a large catalog page through the stdlib JSONResponse and OrjsonResponse.
+
+    python -m benchmarks.bench_json_response
+"""
+
+import timeit
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+
+from lib.model.catalog_type import CatalogType
+from lib.providers.catalog_info import ImdbInfo
+from lib.responses import OrjsonResponse
+
+
+def build_page(size: int) -> dict:
+    metas = []
+    for idx in range(size):
+        imdb_id = f"tt{idx:07d}"
+        metas.append(
+            {
+                "id": imdb_id,
+                "imdb_id": imdb_id,
+                "type": "series",
+                "name": f"Series {idx}",
+                "poster": f"https://images.metahub.space/poster/medium/{imdb_id}/img",
+                "background": f"https://images.metahub.space/background/medium/{imdb_id}/img",
+                "genres": ["Drama", "Sci-Fi"],
+                "releaseInfo": "2021",
+                "imdbRating": "7.4",
+                "description": "A long synopsis for the series. " * 8,
+                "cast": ["First Actor", "Second Actor", "Third Actor"],
+                "videos": [
+                    {
+                        "id": f"{imdb_id}:1:{episode}",
+                        "name": f"Episode {episode}",
+                        "season": 1,
+                        "episode": episode,
+                        "released": "2021-01-01T00:00:00.000Z",
+                        "overview": "Episode overview. " * 4,
+                    }
+                    for episode in range(1, 21)
+                ],
+            }
+        )
+    return {"metas": metas, "total": len(metas)}
+
+
+def main():
+    page = build_page(1000)
+    rounds = 20
+    stdlib = min(timeit.repeat(lambda: JSONResponse(page), number=1, repeat=rounds))
+    fast = min(timeit.repeat(lambda: OrjsonResponse(page), number=1, repeat=rounds))
+    size = len(OrjsonResponse(page).body)
+    print(f"catalog page: {page['total']} metas, {size / 1024:.0f} KiB")
+    print(f"JSONResponse:   {stdlib * 1000:8.2f} ms")
+    print(f"OrjsonResponse: {fast * 1000:8.2f} ms ({stdlib / fast:.1f}x)")
+
+    # Types the stdlib encoder rejects outright
+    extras = {
+        "catalog": [ImdbInfo("tt0000001", CatalogType.MOVIES, ["Drama"], "2021")],
+        "built": datetime.now(),
+    }
+    print(f"native types:   {OrjsonResponse(extras).body[:80]!r}...")
+
+
+if __name__ == "__main__":
+    main()
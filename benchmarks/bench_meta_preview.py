@@ -0,0 +1,169 @@
+"""
+Snapshot and catalog page payload size with full Cinemeta metas and with catalog previews.
+
+    python -m benchmarks.bench_meta_preview [snapshot path]
+
+Given a snapshot file, its metas are measured. Otherwise every catalog of the bundled catalogs.json
+is filled with Cinemeta-shaped metas, the repo does not ship the metas themselves.
+
+Resident memory is not compared: /meta serves the full metas, so a worker keeps them decoded when
+SNAPSHOT_PATH is empty and projects previews on access, and decodes neither ahead when it maps a snapshot.
+"""
+
+import gzip
+import random
+import sys
+
+import brotli
+import orjson
+
+from lib.cached_body import BROTLI_QUALITY, GZIP_LEVEL
+from lib.catalog_cache import PAGE_SIZE, get_preview_meta
+from lib.snapshot_file import META_PREFIX, open_snapshot
+
+ITEMS_PER_CATALOG = 100
+GENRES = [
+    "Action",
+    "Adventure",
+    "Animation",
+    "Comedy",
+    "Crime",
+    "Drama",
+    "Family",
+    "Horror",
+    "Romance",
+    "Sci-Fi",
+]
+
+
+def build_meta(rng: random.Random, imdb_id: str, c_type: str) -> dict:
+    """A meta with the fields Cinemeta's metasDetailed returns, sized like typical entries."""
+    name = f"Title {imdb_id}"
+    people = [f"Person {rng.randint(1, 99999)}" for _ in range(8)]
+    meta = {
+        "id": imdb_id,
+        "imdb_id": imdb_id,
+        "type": c_type,
+        "name": name,
+        "slug": f"{c_type}/{name.lower().replace(' ', '-')}-{imdb_id[2:]}",
+        "poster": f"https://images.metahub.space/poster/small/{imdb_id}/img",
+        "background": f"https://images.metahub.space/background/medium/{imdb_id}/img",
+        "logo": f"https://images.metahub.space/logo/medium/{imdb_id}/img",
+        "description": " ".join(
+            rng.choice(["a", "story", "about", "the", "family", "war", "city"]) for _ in range(45)
+        ),
+        "genres": rng.sample(GENRES, 3),
+        "releaseInfo": str(rng.randint(1990, 2024)),
+        "year": str(rng.randint(1990, 2024)),
+        "released": "2021-10-01T00:00:00.000Z",
+        "runtime": f"{rng.randint(80, 160)} min",
+        "imdbRating": f"{rng.uniform(4, 9):.1f}",
+        "country": "United States",
+        "awards": "2 wins & 5 nominations",
+        "director": people[:1],
+        "writer": people[1:3],
+        "cast": people[3:7],
+        "moviedb_id": rng.randint(1, 999999),
+        "popularity": rng.random(),
+        "popularities": {"moviedb": rng.random(), "trakt": rng.randint(1, 999), "stremio": rng.random()},
+        "trailers": [{"source": f"yt{rng.randint(0, 10 ** 9)}", "type": "Trailer"} for _ in range(2)],
+        "trailerStreams": [{"title": name, "ytId": f"yt{rng.randint(0, 10 ** 9)}"} for _ in range(2)],
+        "links": [
+            {
+                "name": person,
+                "category": category,
+                "url": f"stremio:///search?search={person.replace(' ', '%20')}",
+            }
+            for category, group in (
+                ("Directors", people[:1]),
+                ("Writers", people[1:3]),
+                ("Cast", people[3:7]),
+            )
+            for person in group
+        ]
+        + [
+            {"name": genre, "category": "Genres", "url": f"stremio:///discover/{c_type}?genre={genre}"}
+            for genre in GENRES[:3]
+        ],
+        "behaviorHints": {
+            "defaultVideoId": imdb_id if c_type == "movie" else None,
+            "hasScheduledVideos": False,
+        },
+        "videos": [],
+    }
+    if c_type == "series":
+        meta["videos"] = [
+            {
+                "id": f"{imdb_id}:{season}:{episode}",
+                "name": f"Episode {episode}",
+                "season": season,
+                "number": episode,
+                "episode": episode,
+                "firstAired": "2019-01-01T05:00:00.000Z",
+                "released": "2019-01-01T05:00:00.000Z",
+                "rating": f"{rng.uniform(5, 9):.1f}",
+                "tvdb_id": rng.randint(1, 9999999),
+                "overview": " ".join(
+                    rng.choice(["the", "crew", "finds", "a", "new", "lead"]) for _ in range(30)
+                ),
+                "description": "",
+                "thumbnail": f"https://episodes.metahub.space/{imdb_id}/{season}/{episode}/w780.jpg",
+            }
+            for season in range(1, rng.randint(2, 5))
+            for episode in range(1, 11)
+        ]
+    return meta
+
+
+def load_bundled_metas() -> list[dict]:
+    with open("catalogs.json", "rb") as file:
+        catalogs = orjson.loads(file.read())["data"]["data"]
+    rng = random.Random(0)
+    metas = []
+    for index, catalog in enumerate(catalogs):
+        for item in range(ITEMS_PER_CATALOG):
+            metas.append(build_meta(rng, f"tt{index:03d}{item:04d}", catalog.get("type", "movie")))
+    print(f"{len(catalogs)} bundled catalogs x {ITEMS_PER_CATALOG} generated metas")
+    return metas
+
+
+def load_snapshot_metas(path: str) -> list[dict]:
+    snapshot = open_snapshot(path)
+    if snapshot is None:
+        raise SystemExit(f"No snapshot at {path}")
+    metas = [orjson.loads(snapshot.get(key)) for key in snapshot.keys(META_PREFIX)]
+    print(f"{len(metas)} metas from {path}")
+    return metas
+
+
+def measure_blobs(metas: list[dict]) -> int:
+    return sum(len(orjson.dumps(meta)) for meta in metas)
+
+
+def measure_pages(metas: list[dict]) -> tuple[int, int, int]:
+    raw = br = gz = 0
+    for start in range(0, len(metas), PAGE_SIZE):
+        page = metas[start : start + PAGE_SIZE]
+        body = orjson.dumps({"metas": page, "total": len(page)})
+        raw += len(body)
+        br += len(brotli.compress(body, quality=BROTLI_QUALITY))
+        gz += len(gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0))
+    return raw, br, gz
+
+
+def main():
+    metas = load_snapshot_metas(sys.argv[1]) if len(sys.argv) > 1 else load_bundled_metas()
+    previews = [get_preview_meta(meta) for meta in metas]
+
+    print(f"{'':<22} {'full':>12} {'preview':>12} {'reduction':>10}")
+    rows = [("meta blobs", measure_blobs(metas), measure_blobs(previews))]
+    labels = ("pages raw", "pages br", "pages gzip")
+    rows.extend(zip(labels, measure_pages(metas), measure_pages(previews)))
+    for label, full, preview in rows:
+        print(f"{label:<22} {full / 1024:>9.0f} KB {preview / 1024:>9.0f} KB {1 - preview / full:>9.0%}")
+    pages = -(-len(metas) // PAGE_SIZE)
+    print(f"{'per page raw':<22} {rows[1][1] / pages / 1024:>9.1f} KB {rows[1][2] / pages / 1024:>9.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
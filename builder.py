@@ -94,14 +94,16 @@ class Builder:
                     "name": "genre",
                     "options": unique_filters,
                 },
+                # Comma separated genres and years, all of them must match
+                {"name": "genres"},
                 {"name": "skip"},
             ],
-            "extraSupported": ["genre", "skip"],
+            "extraSupported": ["genre", "genres", "skip"],
         }
         return data
 
     def __get_item_id(self, item: CatalogConfig, conf_type: CatalogType) -> str:
-        return f"{item.name_id.lower()}.{conf_type.value.lower()}"
+        return item.get_item_id(conf_type)
 
     def build_catalog(self, item: CatalogConfig) -> list:
         outputs = []
@@ -142,6 +144,7 @@ class Builder:
                 return None
 
             metas = item_metas.get("metas") or []
+            # Kept whole for /meta and the metas table, catalog previews are projected when publishing
             dict_by_id = {item.get("id"): item for item in metas}
             imdb_infos = self.update_imdb_infos(imdb_infos, item_metas)
 
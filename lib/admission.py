@@ -0,0 +1,126 @@
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from lib import log
+from lib.metrics import REGISTRY, Counter, Gauge
+
+ADMISSION_SHED = REGISTRY.register(
+    Counter(
+        "cyberflix_admission_shed_total",
+        "Requests rejected with 503 by admission control, by route class and reason.",
+        ("route_class", "reason"),
+    )
+)
+ADMISSION_QUEUED = REGISTRY.register(
+    Gauge("cyberflix_admission_queued", "Requests waiting for a slot, by route class.", ("route_class",))
+)
+
+T = TypeVar("T")
+
+
+def parse_limits(limits: str) -> dict[str, tuple[int, int]]:
+    """Parse `class=concurrency:queue` pairs, e.g. `catalog=32:128,meta=64:256`."""
+    parsed = {}
+    for part in limits.split(","):
+        name, _, values = part.strip().partition("=")
+        if not name or not values:
+            continue
+        concurrency, _, queue_size = values.partition(":")
+        try:
+            parsed[name.strip()] = (int(concurrency), int(queue_size or 0))
+        except ValueError:
+            log.error(f"::=>[Admission] Ignoring invalid limit {part!r}")
+    return parsed
+
+
+class RouteLimiter:
+    """Concurrency limit with a bounded FIFO of waiters, a released slot is handed to the oldest waiter."""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float) -> None:
+        self.__name: str = name
+        self.__concurrency: int = concurrency
+        self.__queue_size: int = queue_size
+        self.__queue_timeout: float = queue_timeout
+        self.__active: int = 0
+        self.__waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def active(self) -> int:
+        return self.__active
+
+    @property
+    def queued(self) -> int:
+        return len(self.__waiters)
+
+    async def acquire(self) -> bool:
+        if self.__active < self.__concurrency and not self.__waiters:
+            self.__active += 1
+            return True
+        if len(self.__waiters) >= self.__queue_size:
+            ADMISSION_SHED.inc(self.__name, "queue_full")
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.__waiters.append(waiter)
+        ADMISSION_QUEUED.set(len(self.__waiters), self.__name)
+        try:
+            await asyncio.wait_for(waiter, self.__queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            ADMISSION_SHED.inc(self.__name, "queue_timeout")
+            return False
+        except BaseException:
+            # The client went away after being handed a slot, pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self.__waiters:
+                self.__waiters.remove(waiter)
+            ADMISSION_QUEUED.set(len(self.__waiters), self.__name)
+
+    def release(self):
+        while self.__waiters:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                # The slot moves to the waiter, the active count stays the same
+                waiter.set_result(None)
+                return
+        self.__active -= 1
+
+
+class Overloaded(Exception):
+    """Raised when admission control sheds a request, answered with a 503 and Retry-After."""
+
+    def __init__(self, route_class: str) -> None:
+        super().__init__(f"Too many concurrent {route_class} requests")
+        self.route_class: str = route_class
+
+
+class AdmissionControl:
+    """Bound the concurrent upstream-dependent work of a worker, shed the excess fast.
+
+    Only work that waits on Cinemeta, Trakt, RPDB or Supabase goes through it, pages and metas served
+    from the snapshot never take a slot. Work over the limit waits in a bounded queue for at most
+    `queue_timeout` seconds; when the queue is full or the wait times out `Overloaded` is raised.
+    """
+
+    def __init__(self, limits: dict[str, tuple[int, int]], queue_timeout: float) -> None:
+        self.__limiters: dict[str, RouteLimiter] = {
+            name: RouteLimiter(name, concurrency, queue_size, queue_timeout)
+            for name, (concurrency, queue_size) in limits.items()
+            if concurrency > 0
+        }
+
+    async def run(self, route_class: str, work: Callable[[], Awaitable[T]]) -> T:
+        limiter = self.__limiters.get(route_class)
+        if limiter is None:
+            return await work()
+        if not await limiter.acquire():
+            raise Overloaded(route_class)
+        try:
+            return await work()
+        finally:
+            limiter.release()
@@ -2,6 +2,8 @@ import time
 
 import httpx
 
+from lib.metrics import MeteredTransport
+
 
 class AniList:
     def __init__(self) -> None:
@@ -63,7 +65,7 @@ class AniList:
 
         items = []
         query = self.get_query()
-        with httpx.Client() as client:
+        with httpx.Client(transport=MeteredTransport("anilist")) as client:
             for page in range(1, pages + 1):
                 time.sleep(timeout)
 
@@ -1,8 +1,10 @@
-import json
+import asyncio
 
 import httpx
+import orjson
 
 from lib import log
+from lib.metrics import AsyncMeteredTransport, MeteredTransport
 from typing import Optional
 
 
@@ -15,11 +17,32 @@ class Cinemeta:
             "Accept-Language": "en-US,en;q=0.9",
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0.0.0 Safari/537.36",
         }
+        self.__async_client: Optional[httpx.AsyncClient] = None
+        self.__async_client_loop: Optional[asyncio.AbstractEventLoop] = None
 
     @property
     def url(self) -> str:
         return self.__url
 
+    def __get_async_client(self) -> httpx.AsyncClient:
+        # Keep-alive connections are bound to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self.__async_client is None or self.__async_client_loop is not loop:
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            )
+            self.__async_client = httpx.AsyncClient(
+                follow_redirects=True,
+                transport=AsyncMeteredTransport("cinemeta", transport),
+            )
+            self.__async_client_loop = loop
+        return self.__async_client
+
+    async def close(self):
+        if self.__async_client is not None:
+            await self.__async_client.aclose()
+            self.__async_client = None
+
     def get_metas(self, ids: list[str], s_type: str) -> list[dict]:
         meta_url = f"https://v3-cinemeta.strem.io/catalog/{s_type}/last-videos/lastVideosIds="
         results = []
@@ -30,14 +53,14 @@ class Cinemeta:
                 meta_url += f",{id}.json"
             else:
                 meta_url += f",{id}"
-        with httpx.Client(follow_redirects=True) as client:
+        with httpx.Client(follow_redirects=True, transport=MeteredTransport("cinemeta")) as client:
             try:
                 response = client.get(meta_url, headers=self.__headers, timeout=50)
                 if response.status_code == 200:
                     buffer = response.content
                     if buffer is None:
                         return results
-                    data = json.loads(buffer)
+                    data = orjson.loads(buffer)
                     if isinstance(data, dict):
                         metas_detailed = data.get("metasDetailed", [])
                         for meta in metas_detailed:
@@ -50,7 +73,9 @@ class Cinemeta:
     async def get_metas_async(self, ids: list[str], s_type: str) -> list[dict]:
         meta_url = f"https://v3-cinemeta.strem.io/catalog/{s_type}/last-videos/lastVideosIds="
         results = []
-        async with httpx.AsyncClient(follow_redirects=True) as client:
+        async with httpx.AsyncClient(
+            follow_redirects=True, transport=AsyncMeteredTransport("cinemeta")
+        ) as client:
             for idx, id in enumerate(ids):
                 if idx == 0:
                     meta_url += f"{id}"
@@ -64,7 +89,7 @@ class Cinemeta:
                     buffer = response.content
                     if buffer is None:
                         return results
-                    data = json.loads(buffer)
+                    data = orjson.loads(buffer)
                     if isinstance(data, dict):
                         metas_detailed = data.get("metasDetailed", [])
                         for meta in metas_detailed:
@@ -76,18 +101,35 @@ class Cinemeta:
 
     def get_meta(self, id: str, s_type: str) -> Optional[dict]:
         meta_url = f"{self.__url}meta/{s_type}/{id}.json"
-        with httpx.Client(follow_redirects=True) as client:
+        with httpx.Client(follow_redirects=True, transport=MeteredTransport("cinemeta")) as client:
             try:
                 response = client.get(meta_url, headers=self.__headers, timeout=10)
                 if response.status_code == 200:
                     buffer = response.content
                     if buffer is None:
                         return None
-                    return json.loads(buffer)
+                    return orjson.loads(buffer)
             except Exception as e:
                 log.info(e)
         return None
 
+    async def get_meta_async(self, id: str, s_type: str) -> Optional[dict]:
+        """Cinemeta's response, an empty dict when it does not know the id and None when it failed."""
+        meta_url = f"{self.__url}meta/{s_type}/{id}.json"
+        try:
+            response = await self.__get_async_client().get(meta_url, headers=self.__headers, timeout=10)
+            if response.status_code == 404:
+                return {}
+            if response.status_code == 200:
+                buffer = response.content
+                if buffer is None:
+                    return None
+                return orjson.loads(buffer)
+            log.info(f"::=>[Cinemeta] {meta_url} answered {response.status_code}")
+        except Exception as e:
+            log.info(e)
+        return None
+
     def get_simplified_year(self, year: str) -> str:
         if "–" in year:
             year = year.split("–")[0].strip()
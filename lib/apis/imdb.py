@@ -1,5 +1,7 @@
 import httpx
 
+from lib.metrics import MeteredTransport
+
 
 class IMDB:
     def __init__(self) -> None:
@@ -127,7 +129,7 @@ class IMDB:
             genres = genres.split(",") if "," in genres else [genres]
         last_cursor = ""
         query = {}
-        with httpx.Client() as client:
+        with httpx.Client(transport=MeteredTransport("imdb")) as client:
             for _ in range(1, pages + 1):
                 if search_term is not None:
                     query = self.advanced_title_search(
@@ -2,6 +2,8 @@ import time
 
 import httpx
 
+from lib.metrics import MeteredTransport
+
 
 class JustWatch:
     def __init__(self) -> None:
@@ -149,7 +151,7 @@ class JustWatch:
     def search_title(
         self, search_query: str, count: int = 4, language: str = "en", timeout: int = 10
     ) -> list:
-        with httpx.Client() as client:
+        with httpx.Client(transport=MeteredTransport("justwatch")) as client:
             try:
                 query = self.__get_search_title_query(
                     search_query=search_query, language=language, count=count
@@ -230,7 +232,7 @@ class JustWatch:
                     value = list_value
             schema_dict.update({key: value})
 
-        with httpx.Client() as client:
+        with httpx.Client(transport=MeteredTransport("justwatch")) as client:
             catalog_ids = []
             for _ in range(1, pages + 1):
                 time.sleep(1)
@@ -1,6 +1,7 @@
 import httpx
 
 from lib import env, log
+from lib.metrics import MeteredTransport
 from typing import Optional
 
 
@@ -28,7 +29,7 @@ class MDBList:
         timeout: int = 20,
     ) -> list:
         url = self.__url + schema + f"?apikey={self.__api_key}"
-        with httpx.Client() as client:
+        with httpx.Client(transport=MeteredTransport("mdblist")) as client:
             resp = client.get(
                 url,
                 headers=self.__headers,
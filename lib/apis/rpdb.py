@@ -1,15 +1,24 @@
-import json
-from copy import deepcopy
+import threading
+import time
 
 import httpx
+import orjson
 
-from lib import log, utils
+from lib import env, log
+from lib.cache import LRUCache
+from lib.metrics import MeteredTransport, record_cache
 from typing import Optional
 
+QUOTA_CACHE_SIZE = 4096
+
 
 class RPDB:
     def __init__(self):
         self.__url = "https://api.ratingposterdb.com"
+        # api key -> (checked at, requests left), served stale while a background check refreshes it
+        self.__quotas: LRUCache = LRUCache(max_size=QUOTA_CACHE_SIZE)
+        self.__refreshing: set[str] = set()
+        self.__lock = threading.Lock()
 
     def validate_api_key(self, api_key) -> bool:
         url = f"{self.__url}/{api_key}/isValid"
@@ -17,7 +26,7 @@ class RPDB:
             return False
 
         try:
-            with httpx.Client() as client:
+            with httpx.Client(transport=MeteredTransport("rpdb")) as client:
                 response = client.get(url)
                 return response.status_code == 200
         except Exception as e:
@@ -25,38 +34,85 @@ class RPDB:
         return False
 
     def check_request_left(self, api_key: str) -> int:
+        return self.__fetch_request_left(api_key) or 0
+
+    def __fetch_request_left(self, api_key: str) -> Optional[int]:
         check_limit_url = f"{self.__url}/{api_key}/requests"
         try:
-            with httpx.Client() as client:
+            with httpx.Client(transport=MeteredTransport("rpdb")) as client:
                 response = client.get(check_limit_url)
                 if response.status_code == 200:
                     buffer = response.content
-                    result: dict = json.loads(buffer)
+                    result: dict = orjson.loads(buffer)
                     req: int = result.get("req", None)
                     limit: int = result.get("limit", None)
                     return limit - req
         except Exception as e:
             log.info(e)
-        return 0
+        return None
 
-    def get_poster(self, imdb_id: str, api_key: str, lang="en") -> Optional[str]:
-        url = f"{self.__url}/{api_key}/imdb/poster-default/{imdb_id}.jpg?fallback=true"
+    def get_request_left(self, api_key: str) -> int:
+        """Requests left for a key, from the quota cache once the key has been checked."""
+        quota = self.__quotas.get(api_key)
+        record_cache("rpdb_quota", quota is not None)
+        if quota is None:
+            return self.__refresh_quota(api_key)
+        checked_at, request_left = quota
+        if time.monotonic() - checked_at >= env.RPDB_QUOTA_TTL:
+            self.__schedule_refresh(api_key)
+        return request_left
+
+    def __refresh_quota(self, api_key: str) -> int:
+        request_left = self.__fetch_request_left(api_key)
+        # A failed check is stale right away so the next request retries it
+        checked_at = time.monotonic() if request_left is not None else float("-inf")
+        request_left = request_left or 0
+        self.__quotas.set(api_key, (checked_at, request_left))
+        return request_left
+
+    def __schedule_refresh(self, api_key: str):
+        with self.__lock:
+            if api_key in self.__refreshing:
+                return
+            self.__refreshing.add(api_key)
+
+        def refresh():
+            try:
+                self.__refresh_quota(api_key)
+            finally:
+                with self.__lock:
+                    self.__refreshing.discard(api_key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def __consume_quota(self, api_key: str, count: int):
+        # Every rewritten poster is a request against the key, keep the estimate honest until the next check
+        with self.__lock:
+            quota = self.__quotas.get(api_key)
+            if quota is not None:
+                checked_at, request_left = quota
+                self.__quotas.set(api_key, (checked_at, request_left - count))
+
+    def __get_poster_template(self, api_key: str, lang: str) -> tuple[str, str]:
+        prefix = f"{self.__url}/{api_key}/imdb/poster-default/"
+        suffix = ".jpg?fallback=true"
         if not api_key.startswith("t1-"):
-            url = f"{url}&lang={lang}"
-        return url
+            suffix = f"{suffix}&lang={lang}"
+        return prefix, suffix
+
+    def get_poster(self, imdb_id: str, api_key: str, lang="en") -> Optional[str]:
+        prefix, suffix = self.__get_poster_template(api_key, lang)
+        return f"{prefix}{imdb_id}{suffix}"
 
     def replace_posters(self, metas: list[dict], api_key: str, lang="en") -> list[dict]:
-        new_metas = deepcopy(metas)
-        if self.check_request_left(api_key=api_key) < len(metas):
+        if self.get_request_left(api_key=api_key) < len(metas):
             return metas
 
-        def __get_poster(item: dict, idx: int, worker_id: int, **kwargs) -> dict:
-            if item is None:
-                return None
-            imdb_id = item.get("id", None)
-            api_key = kwargs.get("api_key", None)
-            lang = kwargs.get("lang", "en")
-            item.update({"poster": self.get_poster(imdb_id=imdb_id, api_key=api_key, lang=lang)})
-            return item
-
-        return utils.parallel_for(__get_poster, items=new_metas, api_key=api_key, lang=lang)
+        # Cached metas are shared between requests, only the top level dict of each one is copied
+        prefix, suffix = self.__get_poster_template(api_key, lang)
+        new_metas = [
+            {**meta, "poster": f"{prefix}{meta.get('id', None)}{suffix}"} if meta is not None else None
+            for meta in metas
+        ]
+        self.__consume_quota(api_key, len(metas))
+        return new_metas
@@ -1,8 +1,8 @@
-import json
-
 import httpx
+import orjson
 
 from lib import env, log
+from lib.metrics import MeteredTransport
 from lib.model.catalog_type import CatalogType
 from typing import Optional, Union
 
@@ -28,12 +28,12 @@ class TMDB:
         return self.__api_key
 
     def __request(self, url: str) -> Optional[dict]:
-        with httpx.Client() as client:
+        with httpx.Client(transport=MeteredTransport("tmdb")) as client:
             try:
                 response = client.get(url, headers=self.__headers, timeout=1.5)
                 if response.status_code == 200:
                     buffer = response.content
-                    return json.loads(buffer)
+                    return orjson.loads(buffer)
                 log.info(f"Failed to fetch {url}, skipping...")
             except Exception as e:
                 log.info(e)
@@ -1,8 +1,8 @@
-import json
-
 import httpx
+import orjson
 
 from lib import env, log
+from lib.metrics import MeteredTransport
 from typing import Optional
 
 
@@ -29,14 +29,14 @@ class Trakt:
             "redirect_uri": "urn:ietf:wg:oauth:2.0:oob",
             "grant_type": "authorization_code",
         }
-        with httpx.Client() as client:
+        with httpx.Client(transport=MeteredTransport("trakt")) as client:
             try:
                 response = client.post(token_url, json=payload, timeout=3)
                 if response.status_code == 200:
                     buffer = response.content
                     if buffer is None:
                         return None
-                    access_token = json.loads(buffer).get("access_token", None)
+                    access_token = orjson.loads(buffer).get("access_token", None)
                     return access_token
             except Exception as e:
                 log.info(e)
@@ -57,12 +57,12 @@ class Trakt:
             "page": 1,
             "limit": 100,  # Set pagination limit to 100
         }
-        with httpx.Client() as client:
+        with httpx.Client(transport=MeteredTransport("trakt")) as client:
             try:
                 response = client.get(url, headers=headers, params=params, timeout=3)
                 if response.status_code == 200:
                     buffer = response.content
-                    return json.loads(buffer)
+                    return orjson.loads(buffer)
                 log.info(f"Failed to fetch {url}, skipping...")
             except Exception as e:
                 log.info(e)
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any, Optional
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, max_size: int) -> None:
+        self.__max_size: int = max_size
+        self.__data: OrderedDict[Hashable, Any] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self.__lock:
+            value = self.__data.get(key)
+            if value is not None:
+                self.__data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self.__lock:
+            self.__data[key] = value
+            self.__data.move_to_end(key)
+            while len(self.__data) > self.__max_size:
+                self.__data.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries also expire after a fixed time to live."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.__max_size: int = max_size
+        self.__ttl: float = ttl
+        self.__data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self.__lock:
+            entry = self.__data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.__data[key]
+                return None
+            self.__data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self.__lock:
+            self.__data[key] = (time.monotonic() + self.__ttl, value)
+            self.__data.move_to_end(key)
+            while len(self.__data) > self.__max_size:
+                self.__data.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
@@ -0,0 +1,100 @@
+import gzip
+import hashlib
+from typing import Optional
+
+import brotli
+
+from lib.responses import json_dumps
+
+BROTLI_QUALITY = 9
+GZIP_LEVEL = 9
+# Bodies compressed on demand below this size are sent as they are, gzip gains little on them
+MINIMUM_COMPRESS_SIZE = 1000
+
+
+def parse_accept_encoding(accept_encoding: Optional[str]) -> dict[str, float]:
+    """Map each coding of an Accept-Encoding header to its q-value."""
+    codings: dict[str, float] = {}
+    if not accept_encoding:
+        return codings
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if coding == "":
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        codings[coding] = quality
+    return codings
+
+
+def select_encoding(accept_encoding: Optional[str], available: list[str]) -> Optional[str]:
+    """Pick the first available coding (in preference order) the client accepts, None for identity."""
+    codings = parse_accept_encoding(accept_encoding)
+    wildcard = codings.get("*", 0.0)
+    for coding in available:
+        if codings.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+class CachedBody:
+    def __init__(
+        self,
+        body: bytes | memoryview,
+        precompressed: bool = False,
+        etag: Optional[str] = None,
+        encoded: Optional[dict[str, bytes | memoryview]] = None,
+    ) -> None:
+        self.__body: bytes | memoryview = body
+        # Content hash, so unchanged pages keep their ETag across snapshot builds
+        self.__etag: str = etag or f'"{hashlib.md5(body).hexdigest()}"'
+        self.__encoded: dict[str, bytes | memoryview] = dict(encoded or {})
+        if precompressed and not self.__encoded:
+            self.__encoded.update(
+                {
+                    "br": brotli.compress(body, quality=BROTLI_QUALITY),
+                    "gzip": gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0),
+                }
+            )
+
+    @property
+    def body(self) -> bytes | memoryview:
+        return self.__body
+
+    @property
+    def etag(self) -> str:
+        return self.__etag
+
+    @property
+    def encoded(self) -> dict[str, bytes | memoryview]:
+        return self.__encoded
+
+    def get_etag(self, encoding: Optional[str]) -> str:
+        # Each encoded representation needs its own validator
+        if encoding is None:
+            return self.__etag
+        return f'{self.__etag[:-1]}-{encoding}"'
+
+    def get_encoded(self, accept_encoding: Optional[str]) -> tuple[bytes | memoryview, Optional[str]]:
+        available = list(self.__encoded.keys())
+        if not available and len(self.__body) >= MINIMUM_COMPRESS_SIZE:
+            # Gzipped here rather than by GZipMiddleware, so the gzip body gets its own ETag
+            available = ["gzip"]
+        encoding = select_encoding(accept_encoding, available)
+        if encoding is None:
+            return self.__body, None
+        payload = self.__encoded.get(encoding)
+        if payload is None:
+            payload = gzip.compress(self.__body, compresslevel=GZIP_LEVEL, mtime=0)
+            self.__encoded[encoding] = payload
+        return payload, encoding
+
+    @staticmethod
+    def from_data(data, precompressed: bool = False) -> "CachedBody":
+        return CachedBody(json_dumps(data), precompressed=precompressed)
@@ -0,0 +1,119 @@
+from collections.abc import Iterator, Mapping
+from typing import Optional
+
+from lib import log
+from lib.cached_body import CachedBody
+from lib.providers.catalog_info import ImdbInfo
+
+PAGE_SIZE = 25
+# Fields of a Stremio meta preview that catalog pages use, episodes, trailers and cast links stay out
+PREVIEW_FIELDS = (
+    "id",
+    "type",
+    "name",
+    "poster",
+    "posterShape",
+    "background",
+    "logo",
+    "description",
+    "genres",
+    "releaseInfo",
+    "imdbRating",
+    "runtime",
+    "behaviorHints",
+)
+
+
+def get_preview_meta(meta: dict) -> dict:
+    """Catalog preview of a full Cinemeta meta."""
+    return {field: meta[field] for field in PREVIEW_FIELDS if field in meta}
+
+
+class PreviewMetas(Mapping):
+    """Previews of full metas projected on access, so they are not kept as a second decoded copy."""
+
+    def __init__(self, metas: Mapping) -> None:
+        self.__metas: Mapping = metas
+
+    def __getitem__(self, key: str) -> dict:
+        return get_preview_meta(self.__metas[key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__metas)
+
+    def __len__(self) -> int:
+        return len(self.__metas)
+
+
+def index_metas(metas) -> dict[str, dict]:
+    """Map metas by their own id, the first one wins like the nested-loop lookup it replaces."""
+    metas_by_id: dict[str, dict] = {}
+    for meta in metas:
+        meta_id = meta.get("id") or None
+        if meta_id is not None and meta_id not in metas_by_id:
+            metas_by_id[meta_id] = meta
+    return metas_by_id
+
+
+def order_metas(items: list, metas_by_id: dict[str, dict]) -> list[dict]:
+    """Metas in catalog order, items without a meta are dropped."""
+    sorted_metas = []
+    for item in items:
+        if not isinstance(item, ImdbInfo):
+            continue
+        meta = metas_by_id.get(item.id)
+        if meta is not None:
+            sorted_metas.append(meta)
+    return sorted_metas
+
+
+class CatalogCache:
+    def __init__(self, catalogs: dict, metas: Mapping) -> None:
+        self.__pages: dict[tuple[str, Optional[str], int], CachedBody] = {}
+        for catalog_id, catalog in catalogs.items():
+            if not isinstance(catalog, dict):
+                continue
+            items = [item for item in catalog.get("data") or [] if isinstance(item, ImdbInfo)]
+            if len(items) == 0:
+                continue
+            self.__add_catalog(catalog_id, items, metas)
+        log.info(f"::=>[Catalog Cache] {len(self.__pages)} pages serialized")
+
+    def __len__(self) -> int:
+        return len(self.__pages)
+
+    @staticmethod
+    def __group_by_genre(items: list[ImdbInfo]) -> dict[Optional[str], list[ImdbInfo]]:
+        groups: dict[Optional[str], list[ImdbInfo]] = {None: items}
+        for item in items:
+            keys = set(item.genres or [])
+            if item.year:
+                keys.add(item.year)
+            for key in keys:
+                groups.setdefault(key, []).append(item)
+        return groups
+
+    def __add_catalog(self, catalog_id: str, items: list[ImdbInfo], metas: Mapping):
+        for genre, genre_items in self.__group_by_genre(items).items():
+            for skip in range(0, len(genre_items), PAGE_SIZE):
+                page = self.__serialize_page(genre_items[skip : skip + PAGE_SIZE], metas)
+                if page is None:
+                    continue
+                self.__pages[(catalog_id, genre, skip)] = page
+
+    @staticmethod
+    def __serialize_page(items: list[ImdbInfo], metas: Mapping) -> Optional[CachedBody]:
+        page_metas = []
+        for item in items:
+            meta = metas.get(item.id)
+            if meta is None:
+                # Missing metas are resolved by the dynamic path, don't freeze an incomplete page
+                return None
+            page_metas.append(meta)
+        return CachedBody.from_data({"metas": page_metas, "total": len(page_metas)}, precompressed=True)
+
+    def items(self):
+        return self.__pages.items()
+
+    def get(self, catalog_id: str, genre: Optional[str], skip: int) -> Optional[CachedBody]:
+        return self.__pages.get((catalog_id, genre, skip))
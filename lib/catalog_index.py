@@ -0,0 +1,106 @@
+from collections.abc import Iterator, Mapping, Sequence
+from itertools import chain, islice
+from typing import Optional
+
+from lib.cache import LRUCache
+from lib.catalog_cache import PAGE_SIZE
+from lib.providers.catalog_info import ImdbInfo
+
+INTERSECTION_CACHE_SIZE = 256
+
+
+def matches_filter(item: ImdbInfo, key: str) -> bool:
+    # Numeric genres are release years, the same convention Stremio's year catalogs use
+    if key.isnumeric():
+        return key == item.year
+    return key in (item.genres or [])
+
+
+class CatalogIndex:
+    """Posting lists from every genre and year of a catalog to the positions of its items.
+
+    Postings already built for the same items, like the ones mapped from a snapshot file, are used as is.
+    """
+
+    def __init__(self, items: list, postings: Optional[Mapping[str, Sequence[int]]] = None) -> None:
+        self.__items: list[ImdbInfo] = [item for item in items if isinstance(item, ImdbInfo)]
+        if postings is None:
+            postings = {}
+            for position, item in enumerate(self.__items):
+                keys = set(item.genres or [])
+                if item.year:
+                    keys.add(item.year)
+                for key in keys:
+                    postings.setdefault(key, []).append(position)
+        self.__postings: Mapping[str, Sequence[int]] = postings
+        self.__intersections: LRUCache = LRUCache(max_size=INTERSECTION_CACHE_SIZE)
+
+    @property
+    def items(self) -> list[ImdbInfo]:
+        return self.__items
+
+    @property
+    def postings(self) -> Mapping[str, Sequence[int]]:
+        return self.__postings
+
+    def __get_positions(self, filters: tuple[str, ...]) -> Sequence[int]:
+        if len(filters) == 1:
+            return self.__postings.get(filters[0], [])
+        positions = self.__intersections.get(filters)
+        if positions is None:
+            postings = sorted((self.__postings.get(key, []) for key in filters), key=len)
+            others = [set(posting) for posting in postings[1:]]
+            # Walk the shortest list, positions stay in catalog order
+            positions = [position for position in postings[0] if all(position in other for other in others)]
+            self.__intersections.set(filters, positions)
+        return positions
+
+    def count(self, filters: tuple[str, ...] = ()) -> int:
+        if not filters:
+            return len(self.__items)
+        return len(self.__get_positions(filters))
+
+    def page(self, filters: tuple[str, ...], skip: int, page_size: int = PAGE_SIZE) -> list[ImdbInfo]:
+        """Items of one page matching every filter, a genre name or a year."""
+        if not filters:
+            return self.__items[skip : skip + page_size]
+        positions = self.__get_positions(filters)
+        return [self.__items[position] for position in positions[skip : skip + page_size]]
+
+
+class CatalogOverlay(Sequence):
+    """Read-only view of a shared catalog followed by per-request items, neither list is copied or changed."""
+
+    def __init__(self, base: CatalogIndex, extra: list) -> None:
+        self.__base: CatalogIndex = base
+        self.__extra: list = extra
+
+    def __len__(self) -> int:
+        return len(self.__base.items) + len(self.__extra)
+
+    def __iter__(self) -> Iterator:
+        return chain(self.__base.items, self.__extra)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(islice(self, *index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        base_items = self.__base.items
+        if 0 <= index < len(base_items):
+            return base_items[index]
+        return self.__extra[index - len(base_items)]
+
+    def page(self, filters: tuple[str, ...], skip: int, page_size: int = PAGE_SIZE) -> list[ImdbInfo]:
+        """Same page as filtering the concatenated list, the shared part still goes through its index."""
+        base_count = self.__base.count(filters)
+        items = self.__base.page(filters, skip, page_size) if skip < base_count else []
+        if len(items) < page_size:
+            extra_skip = max(0, skip - base_count)
+            matching = (
+                item
+                for item in self.__extra
+                if isinstance(item, ImdbInfo) and all(matches_filter(item, key) for key in filters)
+            )
+            items.extend(islice(matching, extra_skip, extra_skip + page_size - len(items)))
+        return items
@@ -1,11 +1,13 @@
 from supabase import create_client
 
 from lib import env, log
+from lib.metrics import MeteredTransport
 from lib.providers.catalog_info import ImdbInfo
 from lib.utils import parallel_for
 
 from datetime import datetime
 from collections import OrderedDict
+from collections.abc import MutableMapping
 import json
 
 
@@ -22,6 +24,9 @@ class DatabaseManager:
         # Only initialize once
         if not DatabaseManager._initialized:
             self.supabase = create_client(env.SUPABASE_URL, env.SUPABASE_KEY)
+            # postgrest builds its own httpx session, meter it by wrapping the transport it was given
+            session = self.supabase.postgrest.session
+            session._transport = MeteredTransport("supabase", session._transport)
 
             # try:
             #     _ = self.supabase.rpc('manifest').execute()
@@ -86,6 +91,12 @@ class DatabaseManager:
     def cached_metas(self) -> dict:
         return self.__cached_data["metas"]
 
+    def replace_catalogs(self, catalogs: dict):
+        self.__cached_data["catalogs"] = catalogs
+
+    def replace_metas(self, metas: MutableMapping):
+        self.__cached_data["metas"] = metas
+
     def get_tmdb_ids(self) -> dict:
         return {}
         # try:
@@ -414,9 +425,7 @@ class DatabaseManager:
 
             if not response.data:
                 return {}
-            metas = {item['key']: item['value'] for item in response.data}
-            self.__cached_data["metas"].update(metas)
-            return metas
+            return {item['key']: item['value'] for item in response.data}
         except Exception as e:
             log.error(f"Failed to read specific metas: {e}")
             return {}
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 from typing import Optional
@@ -22,3 +23,32 @@ SUPABASE_KEY: Optional[str] = os.getenv("SUPABASE_KEY") or None
 
 SPONSOR: str = os.getenv("SPONSOR") or ""
 SKIP_DB_UPDATE: bool = os.getenv("SKIP_DB_UPDATE") == "True"
+
+META_CACHE_BYTES: int = int(os.getenv("META_CACHE_BYTES") or 64 * 1024 * 1024)
+META_CACHE_COMPRESS: bool = os.getenv("META_CACHE_COMPRESS") == "True"
+META_CACHE_TTL: int = int(os.getenv("META_CACHE_TTL") or 60 * 60 * 6)
+META_NEGATIVE_TTL: int = int(os.getenv("META_NEGATIVE_TTL") or 60 * 5)
+MANIFEST_CACHE_SIZE: int = int(os.getenv("MANIFEST_CACHE_SIZE") or 1024)
+USER_CONFIG_CACHE_SIZE: int = int(os.getenv("USER_CONFIG_CACHE_SIZE") or 4096)
+RPDB_QUOTA_TTL: int = int(os.getenv("RPDB_QUOTA_TTL") or 60 * 5)
+
+PROFILER_SAMPLE_RATE: float = float(os.getenv("PROFILER_SAMPLE_RATE") or 0)
+PROFILER_SECRET: Optional[str] = os.getenv("PROFILER_SECRET") or None
+PROFILER_DIR: str = os.getenv("PROFILER_DIR") or "profiles"
+PROFILER_INTERVAL: float = float(os.getenv("PROFILER_INTERVAL") or 0.005)
+
+# Shared by the workers of one host by default, an empty value keeps every snapshot in process memory
+SNAPSHOT_PATH: Optional[str] = (
+    os.getenv("SNAPSHOT_PATH", os.path.join(tempfile.gettempdir(), "cyberflix.snapshot")) or None
+)
+SNAPSHOT_POLL_INTERVAL: int = int(os.getenv("SNAPSHOT_POLL_INTERVAL") or 60)
+LEADER_LOCK_PATH: str = os.getenv("LEADER_LOCK_PATH") or os.path.join(
+    tempfile.gettempdir(), "cyberflix.leader"
+)
+LEADER_LEASE_TABLE: Optional[str] = os.getenv("LEADER_LEASE_TABLE") or None
+LEADER_LEASE_TTL: int = int(os.getenv("LEADER_LEASE_TTL") or 60 * 30)
+
+ADMISSION_CONTROL: bool = os.getenv("ADMISSION_CONTROL") != "False"
+ADMISSION_LIMITS: str = os.getenv("ADMISSION_LIMITS") or "catalog=32:128,meta=64:256"
+ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT") or 10)
+ADMISSION_RETRY_AFTER: int = int(os.getenv("ADMISSION_RETRY_AFTER") or 5)
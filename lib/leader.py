@@ -0,0 +1,183 @@
+import fcntl
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import IO, Optional
+
+from postgrest.exceptions import APIError
+
+from lib import log
+
+LEASE_KEY = "catalog_updater"
+UNIQUE_VIOLATION = "23505"
+
+
+class LeaderElection:
+    """Pick the single process that runs the catalog updater.
+
+    Workers of one host compete for an exclusive file lock, the kernel releases it when the holder dies.
+    When a lease table is configured, the lock holders of every host also compete for a lease row in
+    Supabase, renewed on a timer while held so a long build keeps it, and taken over by another host once
+    it expires. Followers only see
+    what the holder publishes through the shared snapshot path, the holder writes its id next to it so
+    a host that does not share the path notices and stops following.
+    """
+
+    def __init__(
+        self,
+        lock_path: str,
+        holder_path: str,
+        supabase=None,
+        lease_table: Optional[str] = None,
+        lease_ttl: int = 1800,
+    ):
+        self.__lock_path: str = lock_path
+        self.__holder_path: str = holder_path
+        self.__supabase = supabase
+        self.__lease_table: Optional[str] = lease_table
+        self.__lease_ttl: int = lease_ttl
+        self.__holder_id: str = f"{socket.gethostname()}:{os.getpid()}"
+        self.__lock_file: Optional[IO] = None
+        self.__is_leader: bool = False
+        self.__lease_expires_at: Optional[datetime] = None
+        self.__last_attempt: Optional[datetime] = None
+        self.__unshared_checks: int = 0
+        # The updater and the renewal thread both check the lease
+        self.__lock: threading.Lock = threading.Lock()
+        self.__renewal: Optional[threading.Thread] = None
+
+    @property
+    def holder_id(self) -> str:
+        return self.__holder_id
+
+    @property
+    def is_leader(self) -> bool:
+        return self.__is_leader
+
+    @property
+    def last_attempt(self) -> Optional[datetime]:
+        """When the leadership was last checked, None before the first check."""
+        return self.__last_attempt
+
+    def acquire(self) -> bool:
+        """Take or renew the leadership, False while another process holds it."""
+        with self.__lock:
+            self.__last_attempt = datetime.now(timezone.utc)
+            is_leader = self.__acquire_lock() and self.__acquire_lease()
+            self.__set_leader(is_leader)
+        if is_leader and self.__lease_table is not None:
+            self.__start_renewal()
+        return is_leader
+
+    def __set_leader(self, is_leader: bool):
+        if is_leader != self.__is_leader:
+            log.info(f"::=>[Leader] {self.__holder_id} is {'now' if is_leader else 'no longer'} the updater")
+        self.__is_leader = is_leader
+
+    def __start_renewal(self):
+        if self.__renewal is not None and self.__renewal.is_alive():
+            return
+        self.__renewal = threading.Thread(name="Leader Lease", target=self.__renew_lease, daemon=True)
+        self.__renewal.start()
+
+    def __renew_lease(self):
+        """Renew the lease well before it expires for as long as this process holds it."""
+        while True:
+            time.sleep(max(self.__lease_ttl / 3, 1))
+            with self.__lock:
+                if not self.__is_leader or self.__lease_table is None:
+                    return
+                self.__set_leader(self.__acquire_lease())
+
+    def __acquire_lock(self) -> bool:
+        if self.__lock_file is not None:
+            return True
+        lock_file = open(self.__lock_path, "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.__lock_file = lock_file
+        return True
+
+    def __acquire_lease(self) -> bool:
+        if self.__supabase is None or self.__lease_table is None:
+            return True
+        now = datetime.now(timezone.utc)
+        lease = {
+            "holder": self.__holder_id,
+            "expires_at": (now + timedelta(seconds=self.__lease_ttl)).isoformat(),
+        }
+        table = self.__supabase.table(self.__lease_table)
+        try:
+            # Renew our own lease or take over an expired one in a single conditional update
+            response = (
+                table.update(lease)
+                .eq("key", LEASE_KEY)
+                .or_(f'holder.eq."{self.__holder_id}",expires_at.lt."{now.isoformat()}"')
+                .execute()
+            )
+            if not response.data:
+                table.insert({"key": LEASE_KEY, **lease}).execute()
+        except APIError as e:
+            if e.code == UNIQUE_VIOLATION:
+                return self.__follow_lease(table)
+            log.error(f"::=>[Leader] Lease table unavailable: {str(e)}")
+            return self.__holds_unexpired_lease(now)
+        except Exception as e:
+            log.error(f"::=>[Leader] Lease check failed: {str(e)}")
+            return self.__holds_unexpired_lease(now)
+        self.__lease_expires_at = now + timedelta(seconds=self.__lease_ttl)
+        self.__write_holder()
+        return True
+
+    def __holds_unexpired_lease(self, now: datetime) -> bool:
+        # Fail closed, another host may take the lease over once the last one we got expires
+        return self.__lease_expires_at is not None and now < self.__lease_expires_at
+
+    def __follow_lease(self, table) -> bool:
+        """Follow another host's lease, or leave lease mode when its snapshots never reach this host."""
+        self.__lease_expires_at = None
+        try:
+            response = table.select("holder").eq("key", LEASE_KEY).execute()
+        except Exception as e:
+            log.error(f"::=>[Leader] Could not read the lease holder: {str(e)}")
+            return False
+        if not response.data:
+            return False
+        holder = response.data[0].get("holder")
+        if holder == self.__read_holder():
+            self.__unshared_checks = 0
+            return False
+        # The holder writes its id next to the snapshot right after taking the lease, before its first
+        # build, a second check keeps a takeover in progress from looking like an unshared path
+        self.__unshared_checks += 1
+        if self.__unshared_checks < 2:
+            return False
+        log.error(
+            f"::=>[Leader] Lease held by {holder} but {self.__holder_path} was not written by it, "
+            "the snapshot path is not shared, building on this host without the lease"
+        )
+        self.__lease_table = None
+        return True
+
+    def __read_holder(self) -> Optional[str]:
+        try:
+            with open(self.__holder_path, "r") as file:
+                return file.read().strip()
+        except OSError:
+            return None
+
+    def __write_holder(self):
+        if self.__read_holder() == self.__holder_id:
+            return
+        tmp_path = f"{self.__holder_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as file:
+                file.write(self.__holder_id)
+            os.replace(tmp_path, self.__holder_path)
+        except OSError as e:
+            log.error(f"::=>[Leader] Could not write {self.__holder_path}: {str(e)}")
@@ -0,0 +1,106 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Optional
+
+import orjson
+
+from lib.metrics import REGISTRY, Counter, Gauge
+
+META_STORE_BYTES = REGISTRY.register(
+    Gauge("cyberflix_meta_store_bytes", "Encoded bytes held by a meta store.", ("store",))
+)
+META_STORE_EVICTIONS = REGISTRY.register(
+    Counter(
+        "cyberflix_meta_store_evictions_total", "Metas dropped to stay within the byte budget.", ("store",)
+    )
+)
+
+
+class MetaStore:
+    """Metas kept as orjson blobs, optionally deflated, within a byte budget.
+
+    The least recently used entries are evicted once the encoded size goes over `max_bytes`, entries
+    also expire after `ttl` seconds when one is given. Every read decodes a fresh dict, callers may
+    change what they get without touching the stored copy.
+    """
+
+    def __init__(
+        self, name: str, max_bytes: int, ttl: Optional[float] = None, compress: bool = False
+    ) -> None:
+        self.__name: str = name
+        self.__max_bytes: int = max_bytes
+        self.__ttl: Optional[float] = ttl
+        self.__compress: bool = compress
+        self.__data: OrderedDict[Hashable, tuple[float, bytes]] = OrderedDict()
+        self.__resident_bytes: int = 0
+        self.__evictions: int = 0
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__data)
+
+    @property
+    def resident_bytes(self) -> int:
+        return self.__resident_bytes
+
+    @property
+    def evictions(self) -> int:
+        return self.__evictions
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        with self.__lock:
+            entry = self.__data.get(key)
+            if entry is None:
+                return None
+            expires_at, blob = entry
+            if expires_at < time.monotonic():
+                del self.__data[key]
+                self.__resident_bytes -= len(blob)
+                return None
+            self.__data.move_to_end(key)
+        # Decoding happens outside the lock, the blob itself is never changed
+        return orjson.loads(zlib.decompress(blob) if self.__compress else blob)
+
+    def set(self, key: Hashable, meta: dict, ttl: Optional[float] = None):
+        """Store a meta, `ttl` overrides the store's own expiry for this entry."""
+        blob = orjson.dumps(meta)
+        if self.__compress:
+            blob = zlib.compress(blob, 1)
+        if len(blob) > self.__max_bytes:
+            return
+        ttl = ttl if ttl is not None else self.__ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else float("inf")
+        evicted = 0
+        with self.__lock:
+            previous = self.__data.pop(key, None)
+            if previous is not None:
+                self.__resident_bytes -= len(previous[1])
+            self.__data[key] = (expires_at, blob)
+            self.__resident_bytes += len(blob)
+            while self.__resident_bytes > self.__max_bytes:
+                _, (_, evicted_blob) = self.__data.popitem(last=False)
+                self.__resident_bytes -= len(evicted_blob)
+                evicted += 1
+            self.__evictions += evicted
+        if evicted:
+            META_STORE_EVICTIONS.inc(self.__name, amount=evicted)
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
+            self.__resident_bytes = 0
+
+    def update_metrics(self):
+        META_STORE_BYTES.set(self.__resident_bytes, self.__name)
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self.__data),
+            "resident_bytes": self.__resident_bytes,
+            "max_bytes": self.__max_bytes,
+            "evictions": self.__evictions,
+            "compressed": self.__compress,
+        }
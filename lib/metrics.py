@@ -0,0 +1,350 @@
+import bisect
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator
+from typing import Optional
+
+import httpx
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, one series per label values tuple."""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        self.__name: str = name
+        self.__documentation: str = documentation
+        self.__label_names: tuple[str, ...] = label_names
+        self.__values: dict[tuple[str, ...], float] = {}
+        self.__lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self.__lock:
+            self.__values[labels] = self.__values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self.__values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.__name} {self.__documentation}", f"# TYPE {self.__name} counter"]
+        with self.__lock:
+            values = list(self.__values.items())
+        for labels, value in values:
+            lines.append(f"{self.__name}{_format_labels(self.__label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Value that goes up and down, one series per label values tuple."""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        self.__name: str = name
+        self.__documentation: str = documentation
+        self.__label_names: tuple[str, ...] = label_names
+        self.__values: dict[tuple[str, ...], float] = {}
+        self.__lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self.__lock:
+            self.__values[labels] = self.__values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self.__lock:
+            self.__values[labels] = value
+
+    def get(self, *labels: str) -> float:
+        return self.__values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.__name} {self.__documentation}", f"# TYPE {self.__name} gauge"]
+        with self.__lock:
+            values = list(self.__values.items())
+        for labels, value in values:
+            lines.append(f"{self.__name}{_format_labels(self.__label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Bucketed distribution with a sum and a count, one series per label values tuple."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.__name: str = name
+        self.__documentation: str = documentation
+        self.__label_names: tuple[str, ...] = label_names
+        self.__buckets: tuple[float, ...] = tuple(sorted(buckets))
+        # Per series: a count per bucket (the last one is +Inf), then the sum
+        self.__series: dict[tuple[str, ...], list[float]] = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.__buckets, value)
+        with self.__lock:
+            series = self.__series.get(labels)
+            if series is None:
+                series = [0] * (len(self.__buckets) + 2)
+                self.__series[labels] = series
+            series[index] += 1
+            series[-1] += value
+
+    def get_count(self, *labels: str) -> int:
+        series = self.__series.get(labels)
+        return int(sum(series[:-1])) if series is not None else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.__name} {self.__documentation}", f"# TYPE {self.__name} histogram"]
+        with self.__lock:
+            all_series = [(labels, list(series)) for labels, series in self.__series.items()]
+        for labels, series in all_series:
+            cumulative = 0
+            for bound, count in zip(self.__buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                bucket_labels = _format_labels(self.__label_names, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.__name}_bucket{bucket_labels} {_format_value(cumulative)}")
+            series_labels = _format_labels(self.__label_names, labels)
+            lines.append(f"{self.__name}_sum{series_labels} {_format_value(series[-1])}")
+            lines.append(f"{self.__name}_count{series_labels} {_format_value(cumulative)}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.__metrics: list = []
+
+    def register(self, metric):
+        self.__metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in self.__metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(
+    Counter(
+        "cyberflix_http_requests_total",
+        "HTTP requests by route, method and status.",
+        ("route", "method", "status"),
+    )
+)
+HTTP_REQUEST_DURATION = REGISTRY.register(
+    Histogram("cyberflix_http_request_duration_seconds", "HTTP request latency by route.", ("route",))
+)
+HTTP_RESPONSE_SIZE = REGISTRY.register(
+    Histogram(
+        "cyberflix_http_response_size_bytes", "HTTP response body size by route.", ("route",), SIZE_BUCKETS
+    )
+)
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge("cyberflix_http_requests_in_flight", "HTTP requests being served."))
+
+CACHE_REQUESTS = REGISTRY.register(
+    Counter("cyberflix_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+)
+CACHE_ENTRIES = REGISTRY.register(Gauge("cyberflix_cache_entries", "Entries held by each cache.", ("cache",)))
+
+UPSTREAM_REQUESTS = REGISTRY.register(
+    Counter(
+        "cyberflix_upstream_requests_total",
+        "Upstream calls by upstream and status class, transport failures are counted as error.",
+        ("upstream", "status"),
+    )
+)
+UPSTREAM_RESPONSE_BYTES = REGISTRY.register(
+    Counter(
+        "cyberflix_upstream_response_bytes_total",
+        "Response bytes received from each upstream.",
+        ("upstream",),
+    )
+)
+UPSTREAM_REQUEST_DURATION = REGISTRY.register(
+    Histogram("cyberflix_upstream_request_duration_seconds", "Upstream call latency.", ("upstream",))
+)
+
+
+def record_cache(cache: str, hit: bool, amount: int = 1):
+    if amount > 0:
+        CACHE_REQUESTS.inc(cache, "hit" if hit else "miss", amount=amount)
+
+
+def record_upstream(upstream: str, started_at: float, status: str, size: int = 0):
+    UPSTREAM_REQUESTS.inc(upstream, status)
+    UPSTREAM_REQUEST_DURATION.observe(time.perf_counter() - started_at, upstream)
+    if size > 0:
+        UPSTREAM_RESPONSE_BYTES.inc(upstream, amount=size)
+
+
+def get_status_class(status_code: int) -> str:
+    return f"{status_code // 100}xx"
+
+
+class _MeteredStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, upstream: str, started_at: float, status: str) -> None:
+        self.__stream = stream
+        self.__upstream: str = upstream
+        self.__started_at: float = started_at
+        self.__status: str = status
+        self.__size: int = 0
+        self.__recorded: bool = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.__stream:
+            self.__size += len(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self.__stream.close()
+        finally:
+            if not self.__recorded:
+                self.__recorded = True
+                record_upstream(self.__upstream, self.__started_at, self.__status, self.__size)
+
+
+class _AsyncMeteredStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, upstream: str, started_at: float, status: str) -> None:
+        self.__stream = stream
+        self.__upstream: str = upstream
+        self.__started_at: float = started_at
+        self.__status: str = status
+        self.__size: int = 0
+        self.__recorded: bool = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.__stream:
+            self.__size += len(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.__stream.aclose()
+        finally:
+            if not self.__recorded:
+                self.__recorded = True
+                record_upstream(self.__upstream, self.__started_at, self.__status, self.__size)
+
+
+class MeteredTransport(httpx.BaseTransport):
+    """Wrap an httpx transport to count calls, bytes, latency and failures of one upstream.
+
+    The call is recorded when the response body is closed, so latency covers the whole download.
+    """
+
+    def __init__(self, upstream: str, transport: Optional[httpx.BaseTransport] = None) -> None:
+        self.__upstream: str = upstream
+        self.__transport: httpx.BaseTransport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started_at = time.perf_counter()
+        try:
+            response = self.__transport.handle_request(request)
+        except Exception:
+            record_upstream(self.__upstream, started_at, "error")
+            raise
+        response.stream = _MeteredStream(
+            response.stream, self.__upstream, started_at, get_status_class(response.status_code)
+        )
+        return response
+
+    def close(self) -> None:
+        self.__transport.close()
+
+
+class AsyncMeteredTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of MeteredTransport."""
+
+    def __init__(self, upstream: str, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self.__upstream: str = upstream
+        self.__transport: httpx.AsyncBaseTransport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started_at = time.perf_counter()
+        try:
+            response = await self.__transport.handle_async_request(request)
+        except Exception:
+            record_upstream(self.__upstream, started_at, "error")
+            raise
+        response.stream = _AsyncMeteredStream(
+            response.stream, self.__upstream, started_at, get_status_class(response.status_code)
+        )
+        return response
+
+    async def aclose(self) -> None:
+        await self.__transport.aclose()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and body size per route template."""
+
+    def __init__(self, app, excluded_paths: tuple[str, ...] = ()) -> None:
+        self.app = app
+        self.__excluded_paths: tuple[str, ...] = excluded_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.__excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        root_path = scope.get("root_path", "")
+        state = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = self.__get_route(scope, root_path)
+            HTTP_REQUESTS.inc(route, scope["method"], str(state["status"]))
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started_at, route)
+            HTTP_RESPONSE_SIZE.observe(state["size"], route)
+
+    @staticmethod
+    def __get_route(scope, root_path: str) -> str:
+        # The router stores the matched route in the scope, raw paths would explode the label cardinality
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        mount_path = scope.get("root_path", "")
+        if mount_path != root_path:
+            return f"{mount_path}/{{path}}"
+        return "unmatched"
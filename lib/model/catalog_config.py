@@ -13,7 +13,8 @@ class CatalogConfig:
         self.__types: list[CatalogType] = types
         self.__schema: str = schema
         self.__filter_type: CatalogFilterType = kwargs.get("filter_type") or CatalogFilterType.CATEGORIES
-        self.__expiration_date: datetime = datetime.now() + timedelta(days=kwargs.get("expiration_days", 1))
+        self.__expiration_days: int = kwargs.get("expiration_days", 1)
+        self.__expiration_date: datetime = datetime.now() + timedelta(days=self.__expiration_days)
         self.__pages: int | None = kwargs.get("pages", None)
         self.__force_update: bool = kwargs.get("force_update", False)
 
@@ -37,6 +38,10 @@ class CatalogConfig:
     def schema(self) -> str:
         return self.__schema
 
+    @property
+    def expiration_days(self) -> int:
+        return self.__expiration_days
+
     @property
     def expiration_date(self) -> datetime:
         return self.__expiration_date
@@ -52,3 +57,6 @@ class CatalogConfig:
     @property
     def force_update(self) -> bool:
         return self.__force_update
+
+    def get_item_id(self, conf_type: CatalogType) -> str:
+        return f"{self.__name_id.lower()}.{conf_type.value.lower()}"
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
 import hashlib
+from typing import Optional
 
 
 class CatalogWeb:
     def __init__(self, id: str, name: str, selected: bool = False):
         self.__id: str = id
-        self.__uuid: str = hashlib.md5(self.__id.encode()).hexdigest()[:5]
+        self.__uuid: Optional[str] = None
         self.__name: str = name
         self.__selected: bool = selected
         self.__children: list[CatalogWeb] = []
+        self.__children_by_id: dict[str, CatalogWeb] = {}
 
     @property
     def id(self) -> str:
@@ -17,6 +19,8 @@ class CatalogWeb:
 
     @property
     def uuid(self) -> str:
+        if self.__uuid is None:
+            self.__uuid = hashlib.md5(self.__id.encode()).hexdigest()[:5]
         return self.__uuid
 
     @property
@@ -36,10 +40,14 @@ class CatalogWeb:
 
     def add_child(self, child):
         self.__children.append(child)
+        self.__children_by_id.setdefault(child.id, child)
+
+    def get_child(self, id: str) -> Optional[CatalogWeb]:
+        return self.__children_by_id.get(id)
 
     def to_dict(self):
         return {
-            "uuid": self.__uuid,
+            "uuid": self.uuid,
             "name": self.__name,
             "isSelected": self.__selected,
             "children": [child.to_dict() for child in self.__children],
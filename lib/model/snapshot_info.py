@@ -0,0 +1,62 @@
+from datetime import datetime
+from typing import Optional
+
+
+class SnapshotInfo:
+    """Descriptor of the published catalog snapshot, cheap enough to read on every probe."""
+
+    def __init__(
+        self,
+        generation: int,
+        version: str,
+        build_id: Optional[str],
+        built_at: Optional[datetime],
+        catalog_count: int,
+        meta_count: int,
+    ):
+        self.__generation: int = generation
+        self.__version: str = version
+        self.__build_id: Optional[str] = build_id
+        self.__built_at: Optional[datetime] = built_at
+        self.__catalog_count: int = catalog_count
+        self.__meta_count: int = meta_count
+
+    @property
+    def generation(self) -> int:
+        return self.__generation
+
+    @property
+    def version(self) -> str:
+        return self.__version
+
+    @property
+    def build_id(self) -> Optional[str]:
+        """Id of the catalog build, None while only the bundled catalogs are served."""
+        return self.__build_id
+
+    @property
+    def built_at(self) -> Optional[datetime]:
+        """When the build finished, not when this worker published or mapped it."""
+        return self.__built_at
+
+    @property
+    def is_built(self) -> bool:
+        return self.__build_id is not None and self.__catalog_count > 0
+
+    @property
+    def catalog_count(self) -> int:
+        return self.__catalog_count
+
+    @property
+    def meta_count(self) -> int:
+        return self.__meta_count
+
+    def to_dict(self) -> dict:
+        return {
+            "generation": self.__generation,
+            "version": self.__version,
+            "build_id": self.__build_id,
+            "built_at": self.__built_at,
+            "catalogs": self.__catalog_count,
+            "metas": self.__meta_count,
+        }
@@ -0,0 +1,120 @@
+import hashlib
+from collections.abc import Container
+from typing import Optional
+
+DEFAULT_LANG = "en"
+# Order in which the configure page writes the segments, keys the server does not read are dropped
+CANONICAL_KEYS = ("catalogs", "rpgb", "trakt", "lang")
+
+
+class UserConfig:
+    """A `/c/{configs}/` path segment compiled once, shared by the manifest and catalog handlers."""
+
+    def __init__(
+        self,
+        catalogs: Optional[tuple[str, ...]],
+        rpdb_key: Optional[str],
+        trakt_key: Optional[str],
+        lang: str,
+        canonical: str = "",
+    ):
+        self.__catalogs: Optional[tuple[str, ...]] = catalogs
+        self.__rpdb_key: Optional[str] = rpdb_key
+        self.__trakt_key: Optional[str] = trakt_key
+        self.__trakt_hash: Optional[str] = (
+            hashlib.sha256(trakt_key.encode()).hexdigest()[:16] if trakt_key else None
+        )
+        self.__lang: str = lang
+        self.__canonical: str = canonical
+
+    @staticmethod
+    def parse(configs: str) -> dict:
+        result = {}
+        splited_configs = configs.split("|") if "|" in configs else [configs]
+        for config in splited_configs:
+            if "=" not in config:
+                continue
+            try:
+                key, value = config.split("=")
+                result.update({key: value})
+            except ValueError:
+                continue
+        return result
+
+    @staticmethod
+    def canonicalize(parsed: dict) -> str:
+        """Single spelling of a parsed config, byte-identical to the segment the configure page writes.
+
+        The page writes every non-empty value in `CANONICAL_KEYS` order and always includes `lang`, so
+        its URLs never redirect. `lang` is always written here too, with its default when missing. The selected catalogs keep their order, it is the order of the manifest
+        catalogs, but repeated and empty uuids are dropped. Uuids missing from the current snapshot are
+        kept so a catalog that comes back in a later build stays selected.
+        """
+        values = dict(parsed)
+        values["lang"] = values.get("lang", None) or DEFAULT_LANG
+        catalogs = values.get("catalogs", None)
+        if catalogs is not None:
+            values["catalogs"] = ",".join(dict.fromkeys(value for value in catalogs.split(",") if value))
+        # An empty catalog selection still differs from no selection, the manifest becomes configurable
+        return "|".join(
+            f"{key}={values[key]}"
+            for key in CANONICAL_KEYS
+            if values.get(key, None) or (key == "catalogs" and catalogs is not None)
+        )
+
+    @classmethod
+    def compile(cls, configs: str, catalog_uuids: Container[str]) -> "UserConfig":
+        parsed = cls.parse(configs)
+        catalogs = parsed.get("catalogs", None)
+        if catalogs is not None:
+            # Unknown uuids are dropped here once instead of on every request
+            catalogs = tuple(value for value in dict.fromkeys(catalogs.split(",")) if value in catalog_uuids)
+        return cls(
+            catalogs=catalogs,
+            rpdb_key=parsed.get("rpgb", None) or None,
+            trakt_key=parsed.get("trakt", None) or None,
+            lang=parsed.get("lang", None) or DEFAULT_LANG,
+            canonical=cls.canonicalize(parsed),
+        )
+
+    @property
+    def catalogs(self) -> Optional[tuple[str, ...]]:
+        """Selected catalog uuids that exist in the snapshot, None when nothing was configured."""
+        return self.__catalogs
+
+    @property
+    def rpdb_key(self) -> Optional[str]:
+        return self.__rpdb_key
+
+    @property
+    def rpdb_tier(self) -> Optional[str]:
+        if self.__rpdb_key is None:
+            return None
+        return self.__rpdb_key.split("-", 1)[0]
+
+    @property
+    def trakt_key(self) -> Optional[str]:
+        return self.__trakt_key
+
+    @property
+    def trakt_hash(self) -> Optional[str]:
+        return self.__trakt_hash
+
+    @property
+    def lang(self) -> str:
+        return self.__lang
+
+    @property
+    def canonical(self) -> str:
+        """Canonical `/c/{configs}/` segment, it always carries at least `lang`."""
+        return self.__canonical
+
+    @property
+    def is_personalized(self) -> bool:
+        """Whether catalog pages depend on the user, and so cannot come from the shared page cache."""
+        return self.__rpdb_key is not None or self.__trakt_key is not None
+
+    @property
+    def key(self) -> tuple:
+        """Identity of the personalized part of a catalog page, the Trakt token only appears hashed."""
+        return self.__rpdb_key, self.__trakt_hash, self.__lang
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from lib import log
+
+PROFILE_HEADER = b"x-profile-token"
+
+
+class StackSampler:
+    """Sample the stacks of every other thread at a fixed interval and fold them into flamegraph lines.
+
+    Sampling is process-wide. Requests served concurrently on the event loop, the thread pool and the
+    catalog updater land in the same profile, each under the name of its thread. Only the samplers of
+    other profiled requests are left out.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.__interval: float = interval
+        self.__stacks: Counter[str] = Counter()
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(name="Stack Sampler", target=self.__run, daemon=True)
+
+    @property
+    def stacks(self) -> Counter[str]:
+        return self.__stacks
+
+    def start(self):
+        self.__thread.start()
+
+    def stop(self):
+        """Blocks until the last sample is taken, call it off the event loop."""
+        self.__stop.set()
+        self.__thread.join()
+
+    def __run(self):
+        own_id = threading.get_ident()
+        while not self.__stop.wait(self.__interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or names.get(thread_id) == self.__thread.name:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.__stacks[";".join(reversed(stack))] += 1
+
+
+class ProfilerMiddleware:
+    """Profile a sampled fraction of requests, or those carrying the secret header, into folded stacks.
+
+    Only added to the app when profiling is enabled, so it costs nothing otherwise.
+    """
+
+    def __init__(
+        self, app, directory: str, sample_rate: float, secret: Optional[str], interval: float
+    ) -> None:
+        self.app = app
+        self.__directory: str = directory
+        self.__sample_rate: float = sample_rate
+        self.__secret: Optional[bytes] = secret.encode() if secret else None
+        self.__interval: float = interval
+        os.makedirs(self.__directory, exist_ok=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.__should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(self.__interval)
+        started_at = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+            elapsed = time.perf_counter() - started_at
+            await asyncio.to_thread(self.__write_profile, scope, sampler.stacks, elapsed)
+
+    def __should_profile(self, scope) -> bool:
+        if self.__secret is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.__secret)
+        return self.__sample_rate > 0 and random.random() < self.__sample_rate
+
+    def __write_profile(self, scope, stacks: Counter[str], elapsed: float):
+        tags = self.__get_tags(scope)
+        # Tags become the root frame too, so merged profiles can still be split by route
+        root = ",".join(f"{key}={value}" for key, value in tags.items())
+        name = "_".join(re.sub(r"[^A-Za-z0-9.-]+", "-", value).strip("-") for value in tags.values())
+        # Workers share the directory and profile the same route within one second
+        path = os.path.join(
+            self.__directory,
+            f"{time.strftime('%Y%m%d-%H%M%S')}_{int(elapsed * 1000)}ms_{name}_{uuid.uuid4().hex[:8]}.folded",
+        )
+        try:
+            with open(path, "w") as file:
+                for stack, count in stacks.items():
+                    file.write(f"{root};{stack} {count}\n")
+            log.info(
+                f"::=>[Profiler] {scope['path']} took {elapsed * 1000:.1f} ms, {sum(stacks.values())} samples in {path}"
+            )
+        except OSError as e:
+            log.error(f"::=>[Profiler] Could not write {path}: {str(e)}")
+
+    @staticmethod
+    def __get_tags(scope) -> dict[str, str]:
+        route = scope.get("route")
+        path_params = scope.get("path_params") or {}
+        configs = path_params.get("configs")
+        return {
+            "route": route.path if route is not None else scope["path"],
+            "catalog": path_params.get("id") or "none",
+            "config": hashlib.md5(configs.encode()).hexdigest()[:8] if configs else "none",
+        }
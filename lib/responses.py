@@ -0,0 +1,35 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+from lib.providers.catalog_info import ImdbInfo
+
+
+def orjson_default(obj: Any) -> Any:
+    # datetime and Enum (CatalogType) are serialized natively by orjson and never reach this hook
+    if isinstance(obj, ImdbInfo):
+        return obj.to_dict()
+    if isinstance(obj, set):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def json_dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class OrjsonResponse(JSONResponse):
+    """Project-wide JSON response, knows about ImdbInfo, datetime and CatalogType."""
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
+
+
+class BufferResponse(Response):
+    """Response sending a memoryview of a mapped snapshot as it is, without copying it into bytes."""
+
+    def render(self, content: Any) -> bytes | memoryview:
+        if isinstance(content, memoryview):
+            return content
+        return super().render(content)
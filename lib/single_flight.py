@@ -0,0 +1,43 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class SingleFlight:
+    """Run one coroutine per key at a time, concurrent callers for the same key await the same result."""
+
+    def __init__(self) -> None:
+        self.__calls: dict[Hashable, asyncio.Future] = {}
+        self.__executed: int = 0
+        self.__coalesced: int = 0
+
+    @property
+    def executed(self) -> int:
+        return self.__executed
+
+    @property
+    def coalesced(self) -> int:
+        return self.__coalesced
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.__calls)
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.__calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(function())
+            self.__calls[key] = task
+            self.__executed += 1
+            task.add_done_callback(lambda done: self.__finish(key, done))
+        else:
+            self.__coalesced += 1
+        # A cancelled waiter must not cancel the call the other waiters depend on
+        return await asyncio.shield(task)
+
+    def __finish(self, key: Hashable, task: asyncio.Future):
+        if self.__calls.get(key) is task:
+            del self.__calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every waiter went away
+            task.exception()
@@ -0,0 +1,106 @@
+from collections.abc import Mapping
+from typing import Optional
+
+from lib import env
+from lib.cache import LRUCache
+from lib.cached_body import CachedBody
+from lib.catalog_cache import CatalogCache
+from lib.catalog_index import CatalogIndex
+from lib.model.snapshot_info import SnapshotInfo
+from lib.snapshot_file import MappedCatalogCache
+
+
+class Snapshot:
+    """Everything requests read about one catalog build, published with a single reference swap.
+
+    Nothing in it changes after publishing. A request reads the worker's current snapshot once and
+    keeps using it, so it never mixes two builds, and a replaced snapshot is freed with its last reader.
+    Only the manifest and config caches fill up over its lifetime, with values derived from it.
+    """
+
+    def __init__(
+        self,
+        info: SnapshotInfo,
+        manifest: dict,
+        catalogs: Mapping,
+        metas: Mapping,
+        full_metas: Mapping,
+        catalog_cache: CatalogCache | MappedCatalogCache,
+        catalog_indexes: Mapping[str, CatalogIndex],
+        catalogs_by_uuid: dict[str, list[dict]],
+        web_config: dict,
+        inode: Optional[int] = None,
+    ):
+        self.__info: SnapshotInfo = info
+        self.__manifest: dict = manifest
+        self.__catalogs: Mapping = catalogs
+        self.__metas: Mapping = metas
+        self.__full_metas: Mapping = full_metas
+        self.__catalog_cache: CatalogCache | MappedCatalogCache = catalog_cache
+        self.__catalog_indexes: Mapping[str, CatalogIndex] = catalog_indexes
+        self.__catalogs_by_uuid: dict[str, list[dict]] = catalogs_by_uuid
+        self.__web_config: dict = web_config
+        self.__web_config_body: CachedBody = CachedBody.from_data(web_config, precompressed=True)
+        self.__inode: Optional[int] = inode
+        self.__manifests: LRUCache = LRUCache(max_size=env.MANIFEST_CACHE_SIZE)
+        self.__user_configs: LRUCache = LRUCache(max_size=env.USER_CONFIG_CACHE_SIZE)
+
+    @property
+    def info(self) -> SnapshotInfo:
+        return self.__info
+
+    @property
+    def generation(self) -> int:
+        return self.__info.generation
+
+    @property
+    def manifest(self) -> dict:
+        return self.__manifest
+
+    @property
+    def catalogs(self) -> Mapping:
+        return self.__catalogs
+
+    @property
+    def metas(self) -> Mapping:
+        """Catalog previews of the metas, what catalog pages are built from."""
+        return self.__metas
+
+    @property
+    def full_metas(self) -> Mapping:
+        """Metas as ingested, served by /meta and uploaded to the metas table."""
+        return self.__full_metas
+
+    @property
+    def catalog_cache(self) -> CatalogCache | MappedCatalogCache:
+        return self.__catalog_cache
+
+    @property
+    def catalog_indexes(self) -> Mapping[str, CatalogIndex]:
+        return self.__catalog_indexes
+
+    @property
+    def catalogs_by_uuid(self) -> dict[str, list[dict]]:
+        return self.__catalogs_by_uuid
+
+    @property
+    def web_config(self) -> dict:
+        return self.__web_config
+
+    @property
+    def web_config_body(self) -> CachedBody:
+        return self.__web_config_body
+
+    @property
+    def inode(self) -> Optional[int]:
+        """Inode of the snapshot file it was mapped from or written to, None when it only lives in memory."""
+        return self.__inode
+
+    @property
+    def manifests(self) -> LRUCache:
+        return self.__manifests
+
+    @property
+    def user_configs(self) -> LRUCache:
+        """Configs compiled against this snapshot's catalogs."""
+        return self.__user_configs
@@ -0,0 +1,389 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Iterator, Mapping, MutableMapping, Sequence
+from datetime import datetime
+from typing import Any, Optional
+
+import orjson
+
+from lib import log
+from lib.cached_body import CachedBody
+from lib.catalog_cache import get_preview_meta
+from lib.catalog_index import CatalogIndex
+from lib.providers.catalog_info import ImdbInfo
+from lib.responses import json_dumps
+
+# Layout: header | blobs | index
+#   header: magic, format version, entry count, index offset
+#   blob:   key length (u16), utf-8 key, payload
+#   index:  one (key hash, blob offset, blob length) entry per blob, sorted by key hash
+# Posting lists are packed little-endian u32 positions, mapped as they are on little-endian hosts
+MAGIC = b"CYBRSNAP"
+FORMAT_VERSION = 4
+HEADER = struct.Struct("<8sIIQ")
+INDEX_ENTRY = struct.Struct("<QQI")
+KEY_LENGTH = struct.Struct("<H")
+
+SEPARATOR = "\x1f"
+CATALOG_PREFIX = f"catalog{SEPARATOR}"
+POSTING_PREFIX = f"posting{SEPARATOR}"
+# Full metas served by /meta, and the previews catalog pages are built from
+META_PREFIX = f"meta{SEPARATOR}"
+PREVIEW_PREFIX = f"preview{SEPARATOR}"
+PAGE_PREFIX = f"page{SEPARATOR}"
+# Id and timestamp of the build the snapshot was written from
+BUILD_KEY = "build"
+
+
+def get_key_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def get_page_key(catalog_id: str, genre: Optional[str], skip: int) -> str:
+    return f"{PAGE_PREFIX}{catalog_id}{SEPARATOR}{genre or ''}{SEPARATOR}{skip}"
+
+
+def get_posting_key(catalog_id: str, key: str) -> str:
+    return f"{POSTING_PREFIX}{catalog_id}{SEPARATOR}{key}"
+
+
+def pack_positions(positions: Sequence[int]) -> bytes:
+    packed = array("I", positions)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_positions(payload: memoryview) -> Sequence[int]:
+    if sys.byteorder == "little":
+        return payload.cast("I")
+    positions = array("I", payload)
+    positions.byteswap()
+    return positions
+
+
+class SnapshotWriter:
+    """Write blobs to a temporary file and atomically move it in place once the index is appended."""
+
+    def __init__(self, path: str) -> None:
+        self.__path: str = path
+        self.__tmp_path: str = f"{path}.{os.getpid()}.tmp"
+        self.__file = open(self.__tmp_path, "wb")
+        self.__file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        self.__entries: list[tuple[int, int, int]] = []
+
+    def add(self, key: str, payload: bytes):
+        encoded_key = key.encode()
+        offset = self.__file.tell()
+        self.__file.write(KEY_LENGTH.pack(len(encoded_key)))
+        self.__file.write(encoded_key)
+        self.__file.write(payload)
+        self.__entries.append((get_key_hash(encoded_key), offset, self.__file.tell() - offset))
+
+    def commit(self):
+        self.__entries.sort()
+        index_offset = self.__file.tell()
+        for entry in self.__entries:
+            self.__file.write(INDEX_ENTRY.pack(*entry))
+        self.__file.seek(0)
+        self.__file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(self.__entries), index_offset))
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__file.close()
+        # Workers that mapped the previous file keep reading it until they remap
+        os.replace(self.__tmp_path, self.__path)
+
+    def abort(self):
+        self.__file.close()
+        if os.path.exists(self.__tmp_path):
+            os.remove(self.__tmp_path)
+
+
+class SnapshotFile:
+    """Read-only memory map of a snapshot file, shared through the page cache by every worker."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            self.__mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__inode: int = os.fstat(file.fileno()).st_ino
+        magic, version, count, index_offset = HEADER.unpack_from(self.__mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.__mmap.close()
+            raise ValueError(f"{path} is not a snapshot file of version {FORMAT_VERSION}")
+        self.__path: str = path
+        self.__count: int = count
+        self.__index_offset: int = index_offset
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def inode(self) -> int:
+        return self.__inode
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def __get_entry(self, position: int) -> tuple[int, int, int]:
+        return INDEX_ENTRY.unpack_from(self.__mmap, self.__index_offset + position * INDEX_ENTRY.size)
+
+    def __read_blob(self, offset: int, length: int) -> tuple[bytes, memoryview]:
+        view = memoryview(self.__mmap)[offset : offset + length]
+        key_length = KEY_LENGTH.unpack_from(view, 0)[0]
+        key_end = KEY_LENGTH.size + key_length
+        return bytes(view[KEY_LENGTH.size : key_end]), view[key_end:]
+
+    def get(self, key: str) -> Optional[memoryview]:
+        encoded_key = key.encode()
+        key_hash = get_key_hash(encoded_key)
+        low, high = 0, self.__count
+        while low < high:
+            middle = (low + high) // 2
+            if self.__get_entry(middle)[0] < key_hash:
+                low = middle + 1
+            else:
+                high = middle
+        # Walk the (rare) run of entries sharing the hash
+        while low < self.__count:
+            entry_hash, offset, length = self.__get_entry(low)
+            if entry_hash != key_hash:
+                break
+            blob_key, payload = self.__read_blob(offset, length)
+            if blob_key == encoded_key:
+                return payload
+            low += 1
+        return None
+
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        for position in range(self.__count):
+            _, offset, length = self.__get_entry(position)
+            key = self.__read_blob(offset, length)[0].decode()
+            if key.startswith(prefix):
+                yield key
+
+
+class MappedMetas(MutableMapping):
+    """Metas decoded lazily from a snapshot file, new metas are kept in a per-process overlay."""
+
+    def __init__(
+        self, snapshot: SnapshotFile, overlay: Optional[dict] = None, prefix: str = META_PREFIX
+    ) -> None:
+        self.__snapshot: SnapshotFile = snapshot
+        self.__overlay: dict[str, Any] = overlay if overlay is not None else {}
+        self.__prefix: str = prefix
+        self.__snapshot_count: int = sum(1 for _ in snapshot.keys(prefix))
+        self.__overlay_only: int = sum(
+            1 for key in self.__overlay if self.__snapshot.get(prefix + key) is None
+        )
+
+    def get(self, key, default=None):
+        value = self.__overlay.get(key)
+        if value is not None:
+            return value
+        payload = self.__snapshot.get(self.__prefix + key)
+        if payload is None:
+            return default
+        return orjson.loads(payload)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.__overlay and self.__snapshot.get(self.__prefix + key) is None:
+            self.__overlay_only += 1
+        self.__overlay[key] = value
+
+    def __delitem__(self, key):
+        raise TypeError("Metas of a mapped snapshot are read-only")
+
+    def __contains__(self, key) -> bool:
+        return key in self.__overlay or self.__snapshot.get(self.__prefix + key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.__overlay
+        for key in self.__snapshot.keys(self.__prefix):
+            key = key[len(self.__prefix) :]
+            if key not in self.__overlay:
+                yield key
+
+    def __len__(self) -> int:
+        return self.__snapshot_count + self.__overlay_only
+
+    def copy(self) -> "MappedMetas":
+        return MappedMetas(self.__snapshot, dict(self.__overlay), self.__prefix)
+
+
+class MappedCatalogCache:
+    """Catalog pages serialized into a snapshot file, same lookups as CatalogCache."""
+
+    def __init__(self, snapshot: SnapshotFile) -> None:
+        self.__snapshot: SnapshotFile = snapshot
+        self.__count: int = sum(1 for key in snapshot.keys(PAGE_PREFIX) if key.count(SEPARATOR) == 3)
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def get(self, catalog_id: str, genre: Optional[str], skip: int) -> Optional[CachedBody]:
+        key = get_page_key(catalog_id, genre, skip)
+        body = self.__snapshot.get(key)
+        if body is None:
+            return None
+        encoded = {}
+        for encoding in ("br", "gzip"):
+            payload = self.__snapshot.get(f"{key}{SEPARATOR}{encoding}")
+            if payload is not None:
+                encoded[encoding] = payload
+        etag = bytes(self.__snapshot.get(f"{key}{SEPARATOR}etag")).decode()
+        # Slices of the mapping, only the representation that gets sent is ever read
+        return CachedBody(body, etag=etag, encoded=encoded)
+
+
+class MappedCatalogs(MutableMapping):
+    """Catalogs of a snapshot file, each decoded on first access, assigned ones kept in a per-process overlay."""
+
+    def __init__(self, snapshot: SnapshotFile) -> None:
+        self.__snapshot: SnapshotFile = snapshot
+        self.__keys: list[str] = [key[len(CATALOG_PREFIX) :] for key in snapshot.keys(CATALOG_PREFIX)]
+        self.__decoded: dict[str, Any] = {}
+
+    def __getitem__(self, key):
+        value = self.__decoded.get(key)
+        if value is not None:
+            return value
+        payload = self.__snapshot.get(CATALOG_PREFIX + key)
+        if payload is None:
+            raise KeyError(key)
+        # Two requests decoding the same catalog keep the first result, both are equal
+        return self.__decoded.setdefault(key, decode_catalog(orjson.loads(payload)))
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self.__keys.append(key)
+        self.__decoded[key] = value
+
+    def __delitem__(self, key):
+        raise TypeError("Catalogs of a mapped snapshot are read-only")
+
+    def __contains__(self, key) -> bool:
+        return key in self.__decoded or self.__snapshot.get(CATALOG_PREFIX + key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.__keys))
+
+    def __len__(self) -> int:
+        return len(self.__keys)
+
+
+class MappedPostings(Mapping):
+    """Posting lists of one catalog, memoryview slices of the snapshot file."""
+
+    def __init__(self, snapshot: SnapshotFile, catalog_id: str) -> None:
+        self.__snapshot: SnapshotFile = snapshot
+        self.__prefix: str = get_posting_key(catalog_id, "")
+
+    def __getitem__(self, key) -> Sequence[int]:
+        payload = self.__snapshot.get(self.__prefix + key)
+        if payload is None:
+            raise KeyError(key)
+        return unpack_positions(payload)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.__snapshot.keys(self.__prefix):
+            yield key[len(self.__prefix) :]
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class MappedCatalogIndexes(Mapping):
+    """CatalogIndex of each catalog over its mapped posting lists, created when the catalog is first paged."""
+
+    def __init__(self, snapshot: SnapshotFile, catalogs: Mapping) -> None:
+        self.__snapshot: SnapshotFile = snapshot
+        self.__catalogs: Mapping = catalogs
+        self.__indexes: dict[str, CatalogIndex] = {}
+
+    def __getitem__(self, key) -> CatalogIndex:
+        index = self.__indexes.get(key)
+        if index is not None:
+            return index
+        if key == "data" or self.__snapshot.get(CATALOG_PREFIX + key) is None:
+            raise KeyError(key)
+        catalog = self.__catalogs.get(key)
+        items = (catalog.get("data") or []) if isinstance(catalog, dict) else []
+        index = CatalogIndex(items, postings=MappedPostings(self.__snapshot, key))
+        return self.__indexes.setdefault(key, index)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key in self.__catalogs if key != "data")
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+def write_snapshot(
+    path: str,
+    catalogs: Mapping,
+    metas: Mapping,
+    pages: Iterator[tuple[tuple, CachedBody]],
+    build_id: str,
+    built_at: datetime,
+):
+    writer = SnapshotWriter(path)
+    try:
+        writer.add(BUILD_KEY, json_dumps({"id": build_id, "built_at": built_at.isoformat()}))
+        for catalog_id, catalog in catalogs.items():
+            # The manifest catalog definitions always come from the bundled catalogs.json
+            if catalog_id == "data":
+                continue
+            writer.add(CATALOG_PREFIX + catalog_id, json_dumps(catalog))
+            if not isinstance(catalog, dict):
+                continue
+            for key, positions in CatalogIndex(catalog.get("data") or []).postings.items():
+                writer.add(get_posting_key(catalog_id, key), pack_positions(positions))
+        for key, meta in metas.items():
+            writer.add(META_PREFIX + key, json_dumps(meta))
+            writer.add(PREVIEW_PREFIX + key, json_dumps(get_preview_meta(meta)))
+        for (catalog_id, genre, skip), page in pages:
+            key = get_page_key(catalog_id, genre, skip)
+            writer.add(key, page.body)
+            writer.add(f"{key}{SEPARATOR}etag", page.etag.encode())
+            for encoding, payload in page.encoded.items():
+                writer.add(f"{key}{SEPARATOR}{encoding}", payload)
+        writer.commit()
+    except Exception:
+        writer.abort()
+        raise
+
+
+def decode_catalog(value: Any) -> Any:
+    if not isinstance(value, dict):
+        return value
+    value["data"] = [ImdbInfo.from_dict(item) for item in value.get("data") or []]
+    expiration_date = value.get("expiration_date")
+    if isinstance(expiration_date, str):
+        value["expiration_date"] = datetime.fromisoformat(expiration_date)
+    return value
+
+
+def read_build(snapshot_file: SnapshotFile) -> tuple[str, datetime]:
+    build = orjson.loads(snapshot_file.get(BUILD_KEY))
+    return build["id"], datetime.fromisoformat(build["built_at"])
+
+
+def open_snapshot(path: str) -> Optional[SnapshotFile]:
+    if not os.path.exists(path):
+        return None
+    try:
+        return SnapshotFile(path)
+    except (OSError, ValueError, struct.error) as e:
+        log.error(f"::=>[Snapshot] Could not map {path}: {str(e)}")
+        return None
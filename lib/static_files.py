@@ -0,0 +1,264 @@
+import gzip
+import mimetypes
+import os
+import re
+import stat
+import sys
+from email.utils import parsedate
+from typing import Optional
+
+import anyio
+import brotli
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from lib import log
+from lib.cached_body import select_encoding
+
+SIDECAR_EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+UNCOMPRESSIBLE_EXTENSIONS = {".br", ".gz", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico", ".woff2"}
+MIN_SIDECAR_SIZE = 1024
+STARTUP_BROTLI_QUALITY = 9
+BEST_BROTLI_QUALITY = 11
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+FINGERPRINT_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def read_fingerprint(directory: str) -> str:
+    """Flutter writes a new build id for every `flutter build web`, use it as the bundle fingerprint."""
+    try:
+        with open(os.path.join(directory, ".last_build_id")) as file:
+            return file.read().strip()
+    except OSError as e:
+        log.info(f"IO Error: {e}")
+        return ""
+
+
+def __is_fresh(source: os.stat_result, sidecar_path: str) -> bool:
+    try:
+        return os.stat(sidecar_path).st_mtime >= source.st_mtime
+    except OSError:
+        return False
+
+
+def __write_atomic(path: str, data: bytes):
+    # Several workers may build the same sidecars on a cold start
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_sidecars(directory: str, brotli_quality: int = STARTUP_BROTLI_QUALITY, force: bool = False) -> int:
+    """Write missing or stale .br/.gz sidecars for the compressible files of a directory."""
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in UNCOMPRESSIBLE_EXTENSIONS or name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            source = os.stat(path)
+            if source.st_size < MIN_SIDECAR_SIZE:
+                continue
+            br_path = f"{path}{SIDECAR_EXTENSIONS['br']}"
+            gz_path = f"{path}{SIDECAR_EXTENSIONS['gzip']}"
+            if not force and __is_fresh(source, br_path) and __is_fresh(source, gz_path):
+                continue
+            with open(path, "rb") as file:
+                data = file.read()
+            __write_atomic(br_path, brotli.compress(data, quality=brotli_quality))
+            __write_atomic(gz_path, gzip.compress(data, compresslevel=9, mtime=0))
+            written += 1
+    if written > 0:
+        log.info(f"::=>[Static] Compressed {written} files in {directory}")
+    return written
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse that answers a single byte range by seeking instead of reading the whole file."""
+
+    def __init__(self, path: str, stat_result: os.stat_result, request_headers: Headers, **kwargs) -> None:
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        self.headers["accept-ranges"] = "bytes"
+        self.__range: Optional[tuple[int, int]] = None
+        size = stat_result.st_size
+
+        range_header = request_headers.get("range")
+        if range_header is None or not self.__if_range_matches(request_headers.get("if-range")):
+            return
+        match = RANGE_PATTERN.match(range_header.strip())
+        if match is None:
+            # Multiple or malformed ranges, a full 200 response is always acceptable
+            return
+        first, last = match.groups()
+        if first == "" and last == "":
+            return
+        if first == "":
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last != "" else size - 1
+        if start >= size or start > end:
+            self.status_code = 416
+            self.headers["content-range"] = f"bytes */{size}"
+            self.headers["content-length"] = "0"
+            self.__range = (0, -1)
+            return
+        self.status_code = 206
+        self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(end - start + 1)
+        self.__range = (start, end)
+
+    def __if_range_matches(self, if_range: Optional[str]) -> bool:
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith("W/"):
+            # If-Range only takes strong validators, a weak one always gets the full representation
+            return False
+        if if_range.startswith('"'):
+            etag = self.headers.get("etag", "")
+            return not etag.startswith("W/") and if_range == etag
+        return parsedate(if_range) == parsedate(self.headers.get("last-modified", ""))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.__range is None:
+            await super().__call__(scope, receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        start, end = self.__range
+        remaining = end - start + 1
+        if scope["method"].upper() == "HEAD" or remaining <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves .br/.gz sidecars by content negotiation.
+
+    Paths prefixed with the bundle fingerprint (/static/<build id>/...) are cached as immutable,
+    everything else has to be revalidated with its ETag/Last-Modified.
+    """
+
+    def __init__(self, *, directory: str, **kwargs) -> None:
+        super().__init__(directory=directory, **kwargs)
+        self.__fingerprint: str = read_fingerprint(directory)
+
+    @property
+    def fingerprint(self) -> str:
+        return self.__fingerprint
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        immutable = False
+        segments = path.split(os.sep, 1)
+        if len(segments) == 2 and FINGERPRINT_PATTERN.match(segments[0]):
+            # Old fingerprints still resolve, but only the current one is immutable
+            immutable = segments[0] == self.__fingerprint
+            path = segments[1]
+        response = await super().get_response(path, scope)
+        if immutable and response.status_code in (200, 206, 304):
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    def file_response(
+        self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+        served_path, served_stat, encoding = self.__select_sidecar(
+            str(full_path), stat_result, request_headers
+        )
+
+        headers = {
+            "Cache-Control": REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding is not None:
+            headers.update({"Content-Encoding": encoding})
+
+        response = RangeFileResponse(
+            served_path,
+            stat_result=served_stat,
+            request_headers=request_headers,
+            status_code=status_code,
+            media_type=media_type,
+            headers=headers,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return Response(status_code=304, headers=self.__not_modified_headers(response))
+        return response
+
+    @staticmethod
+    def __not_modified_headers(response: Response) -> dict[str, str]:
+        keys = ("cache-control", "content-encoding", "etag", "last-modified", "vary")
+        return {key: response.headers[key] for key in keys if key in response.headers}
+
+    @staticmethod
+    def __select_sidecar(
+        full_path: str, stat_result: os.stat_result, request_headers: Headers
+    ) -> tuple[str, os.stat_result, Optional[str]]:
+        available = []
+        for encoding, extension in SIDECAR_EXTENSIONS.items():
+            try:
+                sidecar_stat = os.stat(f"{full_path}{extension}")
+            except OSError:
+                continue
+            if stat.S_ISREG(sidecar_stat.st_mode) and sidecar_stat.st_mtime >= stat_result.st_mtime:
+                available.append((encoding, sidecar_stat))
+
+        encoding = select_encoding(request_headers.get("accept-encoding"), [item[0] for item in available])
+        for sidecar_encoding, sidecar_stat in available:
+            if sidecar_encoding == encoding:
+                return f"{full_path}{SIDECAR_EXTENSIONS[encoding]}", sidecar_stat, encoding
+        return full_path, stat_result, None
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves some paths alone, e.g. static files that ship their own sidecars."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        excluded_prefixes: tuple[str, ...] = (),
+        excluded_pattern: Optional[str] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(app, **kwargs)
+        self.__excluded_prefixes = excluded_prefixes
+        self.__excluded_pattern: Optional[re.Pattern] = (
+            re.compile(excluded_pattern) if excluded_pattern else None
+        )
+
+    def __is_excluded(self, path: str) -> bool:
+        if path.startswith(self.__excluded_prefixes):
+            return True
+        return self.__excluded_pattern is not None and self.__excluded_pattern.match(path) is not None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and self.__is_excluded(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+if __name__ == "__main__":
+    # Pre-bake the best compression at image build time: python -m lib.static_files web/
+    target = sys.argv[1] if len(sys.argv) > 1 else "web/"
+    build_sidecars(target, brotli_quality=BEST_BROTLI_QUALITY, force=True)
@@ -1,20 +1,46 @@
+import asyncio
 import hashlib
+import os
 import sys
 import threading
 import time
-from copy import deepcopy
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 
 from builder import Builder
+from catalog_list import CatalogList
 from lib.database_manager import DatabaseManager
 from lib import env, log
+from lib.admission import AdmissionControl, parse_limits
 from lib.apis.rpdb import RPDB
 from lib.apis.trakt import Trakt
+from lib.cache import LRUCache
+from lib.cached_body import CachedBody
+from lib.catalog_cache import CatalogCache, PreviewMetas, get_preview_meta, index_metas, order_metas
+from lib.catalog_index import CatalogIndex, CatalogOverlay
+from lib.leader import LeaderElection
+from lib.meta_store import MetaStore
+from lib.metrics import CACHE_ENTRIES, record_cache
 from lib.model.catalog_type import CatalogType
 from lib.model.catalog_web import CatalogWeb
+from lib.model.snapshot_info import SnapshotInfo
+from lib.model.user_config import UserConfig
 from lib.providers.catalog_info import ImdbInfo
 from lib.providers.catalog_provider import CatalogProvider
+from lib.single_flight import SingleFlight
+from lib.snapshot import Snapshot
+from lib.snapshot_file import (
+    MappedCatalogCache,
+    MappedCatalogIndexes,
+    MappedCatalogs,
+    MappedMetas,
+    PREVIEW_PREFIX,
+    SnapshotFile,
+    open_snapshot,
+    read_build,
+    write_snapshot,
+)
 import json
 
 db_manager = DatabaseManager.instance()
@@ -27,23 +53,62 @@ class WebWorker:
         self.__builder: Builder = Builder()
 
         self.__last_update: datetime = datetime.now()
+        # What the request path reads, only replaced by __publish_snapshot
+        self.__snapshot: Optional[Snapshot] = None
+        self.__catalog_queries: LRUCache = LRUCache(max_size=env.USER_CONFIG_CACHE_SIZE)
+        # Previews of catalog items missing from the snapshot, which stays read-only, and full /meta responses
+        self.__meta_store: MetaStore = MetaStore(
+            "metas", max_bytes=env.META_CACHE_BYTES, ttl=env.META_CACHE_TTL, compress=env.META_CACHE_COMPRESS
+        )
+        self.__meta_requests: SingleFlight = SingleFlight()
+        self.__catalog_requests: SingleFlight = SingleFlight()
+        # Bounds only the work that waits on upstreams, snapshot hits are never shed
+        self.__admission: AdmissionControl = AdmissionControl(
+            limits=parse_limits(env.ADMISSION_LIMITS) if env.ADMISSION_CONTROL else {},
+            queue_timeout=env.ADMISSION_QUEUE_TIMEOUT,
+        )
+        self.__updating: bool = False
+        self.__expiration_days: dict[str, int] = {
+            config.get_item_id(conf_type): config.expiration_days
+            for config in CatalogList.get_catalog_configs()
+            for conf_type in config.types
+        }
+
+        self.__leader: Optional[LeaderElection] = None
+        if env.SNAPSHOT_PATH is None:
+            # Followers would never see the builds of the elected worker
+            log.info("::=>[Leader] SNAPSHOT_PATH is empty, every worker runs its own updater")
+            log.info("::=>[Snapshot] Snapshot metas stay decoded in memory, outside META_CACHE_BYTES")
+        else:
+            self.__leader = LeaderElection(
+                lock_path=env.LEADER_LOCK_PATH,
+                holder_path=f"{env.SNAPSHOT_PATH}.holder",
+                supabase=db_manager.supabase,
+                lease_table=env.LEADER_LEASE_TABLE,
+                lease_ttl=env.LEADER_LEASE_TTL,
+            )
 
         self.__update_interval = self.get_update_interval()
         self.__background_threading_0 = threading.Thread(
             name="Catalog Service", target=self.__background_catalog_updater
         )
 
-        if len(db_manager.cached_catalogs) == 0:
-            log.info("::=>[Catalogs] No catalogs found in local cache, fetching...")
-            self.__update_interval = 0
-        else:
-            self.__manifest_name = db_manager.cached_manifest.get("name", "Unknown")
-            self.__manifest_version = db_manager.cached_manifest.get("version", "Unknown")
-            log.info(f"::=>[Manifest Name] {self.__manifest_name}")
-            log.info(f"::=>[Manifest Version] {self.__manifest_version}")
+        # Serve the last persisted build, or at least the bundled catalogs.json, while a build runs
+        snapshot_file = self.__load_snapshot_file()
+        self.__manifest_name = db_manager.cached_manifest.get("name", "Unknown")
+        self.__manifest_version = db_manager.cached_manifest.get("version", "Unknown")
+        log.info(f"::=>[Manifest Name] {self.__manifest_name}")
+        log.info(f"::=>[Manifest Version] {self.__manifest_version}")
+        if snapshot_file is None:
+            # Mapped catalogs are only decoded once a request pages them
             for key, value in db_manager.cached_catalogs.items():
                 data = value.get("data") or []
                 log.info(f"::=>[Catalog] {key} - {len(data)} items")
+        self.__publish_snapshot(snapshot_file)
+
+        if not any(key != "data" for key in db_manager.cached_catalogs):
+            log.info("::=>[Catalogs] No built catalogs found, serving the bundled ones while fetching...")
+            self.__update_interval = 0
 
         self.__background_threading_0.start()
 
@@ -71,10 +136,10 @@ class WebWorker:
         if len(path) == 1:
             tree.add_child(node)
         else:
-            for child in tree.children:
-                if child.id == path[0]:
-                    self.add_node(child, path[1:], node)
-                    return
+            child = tree.get_child(path[0])
+            if child is not None:
+                self.add_node(child, path[1:], node)
+                return
             new_node_name = path[0].replace("_", " ").title()
             new_node = CatalogWeb(path[0], new_node_name)
             tree.add_child(new_node)
@@ -90,75 +155,93 @@ class WebWorker:
             self.add_node(tree, item_path, node)
         return tree
 
-    def get_web_catalogs(self) -> list:
-        config_manifest = db_manager.cached_manifest
-        print(db_manager.cached_catalogs['data']['data'])
-        tmp_catalogs = config_manifest.get("catalogs", [])
+    def get_web_catalogs(self, manifest: dict, catalogs: dict) -> list:
+        tmp_catalogs = manifest.get("catalogs", [])
         if not len(tmp_catalogs):
-            tmp_catalogs = db_manager.cached_catalogs['data']['data']
+            tmp_catalogs = catalogs['data']['data']
 
         nested_catalogs = self.build_tree(tmp_catalogs).children
         web_catalogs = [nested_catalog.to_dict() for nested_catalog in nested_catalogs]
         return web_catalogs
 
     def get_web_config(self) -> dict:
-        return db_manager.get_web_config(self.get_web_catalogs())
+        return self.__snapshot.web_config
+
+    def get_web_config_body(self) -> CachedBody:
+        return self.__snapshot.web_config_body
 
     def convert_config(self, configs: str) -> dict:
-        result = {}
-        splited_configs = configs.split("|") if "|" in configs else [configs]
-        for config in splited_configs:
-            if "=" not in config:
-                continue
-            try:
-                key, value = config.split("=")
-                result.update({key: value})
-            except ValueError:
-                continue
-        return result
+        return UserConfig.parse(configs)
+
+    def get_user_config(self, configs: Optional[str]) -> Optional[UserConfig]:
+        """Compiled form of a `/c/{configs}/` segment, each distinct segment is parsed once per snapshot."""
+        if configs is None:
+            return None
+        snapshot = self.__snapshot
+        user_configs = snapshot.user_configs
+        user_config = user_configs.get(configs)
+        record_cache("user_config", user_config is not None)
+        if user_config is None:
+            user_config = UserConfig.compile(configs, snapshot.catalogs_by_uuid)
+            user_configs.set(configs, user_config)
+        return user_config
 
     def remove_manifest_catalogs(self, manifest: dict) -> dict:
         manifest.update({"catalogs": []})
         return manifest
 
-    def get_configured_manifest(self, base_url: str, configs: Optional[str]) -> dict:
-        config_manifest = deepcopy(db_manager.cached_manifest)
+    def get_manifest(self, base_url: str, config: Optional[UserConfig], server_version: str) -> CachedBody:
+        snapshot = self.__snapshot
+        selection = config.catalogs if config is not None else None
+        key = (base_url, selection)
+        manifests = snapshot.manifests
+        cached = manifests.get(key)
+        record_cache("manifest", cached is not None)
+        if cached is None:
+            manifest = self.__build_manifest(snapshot, base_url, selection)
+            manifest.update({"server_version": server_version})
+            cached = CachedBody.from_data(manifest, precompressed=True)
+            manifests.set(key, cached)
+        return cached
+
+    def get_configured_manifest(self, base_url: str, config: Optional[UserConfig]) -> dict:
+        return self.__build_manifest(self.__snapshot, base_url, config.catalogs if config is not None else None)
+
+    def __build_manifest(self, snapshot: Snapshot, base_url: str, selection: Optional[tuple[str, ...]]) -> dict:
+        # Top level keys are replaced, never mutated, so a shallow copy is enough
+        config_manifest = dict(snapshot.manifest)
         config_manifest.update({"name": env.APP_NAME})
         config_manifest.update({"logo": f"{base_url}logo.png"})
         config_manifest.update({"background": f"{base_url}background.png"})
         config_manifest.update({"version": self.manifest_version})
-        config_manifest.update({"last_update": str(datetime.now())})
 
-        if configs is None:
-            return self.remove_manifest_catalogs(config_manifest)
-        converted_configs = self.convert_config(configs)
-        config = converted_configs.get("catalogs", None)
-
-        if config is None:
-            return self.remove_manifest_catalogs(config_manifest)
-
-        parsed_config = config.split(",")
-        if len(parsed_config) == 0:
+        if selection is None:
             return self.remove_manifest_catalogs(config_manifest)
 
-        tmp_catalogs = config_manifest.get("catalogs", [])
-        if not len(tmp_catalogs):
-            tmp_catalogs = db_manager.cached_catalogs['data']['data']
-        
+        catalogs_by_uuid = snapshot.catalogs_by_uuid
         new_catalogs = []
-        for value in parsed_config:
-            for catalog in tmp_catalogs:
-                catalog_id = catalog.get("id", None)
-                if catalog_id is None:
-                    continue
-                md5 = hashlib.md5(catalog_id.encode()).hexdigest()[:5]
-                if md5 == value:
-                    new_catalogs.append(catalog)
-
-            config_manifest.update({"behaviorHints": {"configurable": True, "configurationRequired": False}})
+        for value in selection:
+            # The config may have been compiled against the previous snapshot
+            new_catalogs.extend(catalogs_by_uuid.get(value, ()))
+        config_manifest.update({"behaviorHints": {"configurable": True, "configurationRequired": False}})
         config_manifest.update({"catalogs": new_catalogs})
         return config_manifest
 
+    @staticmethod
+    def __index_manifest_catalogs(manifest: dict, catalogs: dict) -> dict[str, list[dict]]:
+        tmp_catalogs = manifest.get("catalogs", [])
+        if not len(tmp_catalogs):
+            tmp_catalogs = catalogs['data']['data']
+
+        catalogs_by_uuid: dict[str, list[dict]] = {}
+        for catalog in tmp_catalogs:
+            catalog_id = catalog.get("id", None)
+            if catalog_id is None:
+                continue
+            md5 = hashlib.md5(catalog_id.encode()).hexdigest()[:5]
+            catalogs_by_uuid.setdefault(md5, []).append(catalog)
+        return catalogs_by_uuid
+
     def get_trakt_auth_url(self) -> str:
         return Trakt().get_authorization_url()
 
@@ -181,73 +264,280 @@ class WebWorker:
             )
         return trakt_metas
 
-    def get_meta(self, id: str, s_type: str, config: Optional[str]) -> dict:
-        imdb_id = id.replace("cyberflix:", "")
-        original_meta = self.__provider.cinemeta.get_meta(id=imdb_id, s_type=s_type) or {}
-        meta = original_meta.get("meta") or {}
-        return {"meta": meta}
+    def __load_snapshot_file(self) -> Optional[SnapshotFile]:
+        """Map the snapshot file a sibling worker (or a previous run) published, if any."""
+        if env.SNAPSHOT_PATH is None:
+            return None
+        snapshot_file = open_snapshot(env.SNAPSHOT_PATH)
+        if snapshot_file is None:
+            return None
+        # The manifest catalog definitions always come from the bundled catalogs.json
+        catalogs = MappedCatalogs(snapshot_file)
+        bundled = db_manager.cached_catalogs.get("data")
+        if bundled is not None:
+            catalogs["data"] = bundled
+        db_manager.replace_catalogs(catalogs)
+        db_manager.replace_metas(MappedMetas(snapshot_file))
+        log.info(f"::=>[Snapshot] Mapped {env.SNAPSHOT_PATH} with {len(catalogs)} catalogs")
+        return snapshot_file
+
+    def __share_snapshot(
+        self, catalog_cache: CatalogCache, build_id: str, built_at: datetime
+    ) -> Optional[SnapshotFile]:
+        """Write the snapshot to the shared file and serve it from the mapping instead of process memory."""
+        if env.SNAPSHOT_PATH is None:
+            return None
+        try:
+            metas = db_manager.cached_metas
+            # Request threads may add metas while the file is written
+            write_snapshot(
+                env.SNAPSHOT_PATH,
+                db_manager.cached_catalogs,
+                dict(metas.items()),
+                catalog_cache.items(),
+                build_id=build_id,
+                built_at=built_at,
+            )
+            snapshot_file = SnapshotFile(env.SNAPSHOT_PATH)
+        except Exception as e:
+            log.error(f"::=>[Snapshot] Could not share snapshot, keeping it in memory: {str(e)}")
+            return None
+        db_manager.replace_metas(MappedMetas(snapshot_file))
+        log.info(f"::=>[Snapshot] Published {env.SNAPSHOT_PATH} with {len(snapshot_file)} entries")
+        return snapshot_file
+
+    def __follow_snapshot_file(self):
+        """Pick up the snapshot the leader published since the last check."""
+        try:
+            inode = os.stat(env.SNAPSHOT_PATH).st_ino
+        except OSError:
+            return
+        if inode == self.__snapshot.inode:
+            return
+        snapshot_file = self.__load_snapshot_file()
+        if snapshot_file is None:
+            return
+        self.__publish_snapshot(snapshot_file)
+        self.__last_update = datetime.now()
+
+    def __publish_snapshot(
+        self,
+        snapshot_file: Optional[SnapshotFile] = None,
+        build_id: Optional[str] = None,
+        built_at: Optional[datetime] = None,
+    ):
+        """Freeze what db_manager holds into a new snapshot and swap it in for the next requests.
+
+        Only the worker that ran build `build_id` shares it, the others map what it wrote.
+        """
+        # Replacing the caches drops every body serialized for the previous snapshot
+        if snapshot_file is None:
+            # Catalog pages only carry previews, projected from the full metas /meta serves
+            previews = PreviewMetas(db_manager.cached_metas)
+            catalog_cache = CatalogCache(db_manager.cached_catalogs, previews)
+            if build_id is not None:
+                snapshot_file = self.__share_snapshot(catalog_cache, build_id, built_at)
+            if snapshot_file is not None:
+                catalog_cache = MappedCatalogCache(snapshot_file)
+        else:
+            catalog_cache = MappedCatalogCache(snapshot_file)
+            build_id, built_at = read_build(snapshot_file)
+        manifest = db_manager.cached_manifest
+        catalogs = db_manager.cached_catalogs
+        metas = db_manager.cached_metas
+        if snapshot_file is not None:
+            previews = MappedMetas(snapshot_file, prefix=PREVIEW_PREFIX)
+            # Every worker pages the posting lists of the shared file instead of building its own
+            catalog_indexes = MappedCatalogIndexes(snapshot_file, catalogs)
+        else:
+            catalog_indexes = {
+                catalog_id: CatalogIndex(catalog.get("data") or [])
+                for catalog_id, catalog in catalogs.items()
+                if catalog_id != "data" and isinstance(catalog, dict)
+            }
+        previous = self.__snapshot
+        info = SnapshotInfo(
+            generation=previous.generation + 1 if previous is not None else 1,
+            version=manifest.get("version", "Unknown"),
+            build_id=build_id,
+            built_at=built_at,
+            catalog_count=sum(1 for key in catalogs if key != "data"),
+            meta_count=len(metas),
+        )
+        # The catalog tree only changes with the snapshot, build it and its body once
+        self.__snapshot = Snapshot(
+            info=info,
+            manifest=manifest,
+            catalogs=catalogs,
+            metas=previews,
+            full_metas=metas,
+            catalog_cache=catalog_cache,
+            catalog_indexes=catalog_indexes,
+            catalogs_by_uuid=self.__index_manifest_catalogs(manifest, catalogs),
+            web_config=db_manager.get_web_config(self.get_web_catalogs(manifest, catalogs)),
+            inode=snapshot_file.inode if snapshot_file is not None else None,
+        )
 
-    async def get_configured_catalog(self, id: str, extras: Optional[str], config: Optional[str]) -> dict:
-        catalog = db_manager.cached_catalogs.get(id) or {}
-        catalog_ids = catalog.get("data") or []
+    def __restore_published_snapshot(self):
+        """Point db_manager back at the published snapshot after a build or upload left it elsewhere."""
+        db_manager.replace_catalogs(self.__snapshot.catalogs)
+        db_manager.replace_metas(self.__snapshot.full_metas)
 
+    def is_ready(self) -> bool:
+        """True once a built, non-empty snapshot is served, the bundled catalogs alone do not count."""
+        return self.__snapshot.info.is_built
 
-        parsed_extras = self.__extras_parser(extras)
-        genre = parsed_extras.get("genre", None)
-        skip = parsed_extras.get("skip", 0)
-        rpdb_key = None
-        trakt_key = None
-        lang_key = "en"
-        if config is not None:
-            converted_configs = self.convert_config(config)
-            if converted_configs is not None:
-                rpdb_key = converted_configs.get("rpgb", None)
-                trakt_key = converted_configs.get("trakt", None)
-                lang_key = converted_configs.get("lang", None)
+    def get_updater_state(self) -> str:
+        if not self.is_updater_healthy():
+            return "stopped"
+        if self.__updating:
+            return "updating"
+        if self.__leader is not None and self.__leader.last_attempt is None:
+            return "starting"
+        if self.__leader is not None and not self.__leader.is_leader:
+            return "following"
+        return "idle"
+
+    def get_snapshot_info(self) -> dict:
+        snapshot = self.__snapshot
+        info = snapshot.info.to_dict() if snapshot is not None else {}
+        info["updater"] = self.get_updater_state()
+        return info
+
+    def get_catalog_expiration_days(self, id: str) -> Optional[int]:
+        return self.__expiration_days.get(id)
+
+    def get_cached_catalog(self, id: str, extras: Optional[str], config: Optional[UserConfig]) -> Optional[CachedBody]:
+        if config is not None and config.is_personalized:
+            return None
+
+        filters, skip = self.__get_catalog_query(extras)
+        if len(filters) > 1:
+            # Only single genre pages are serialized ahead, intersections go through the index
+            return None
+        genre = filters[0] if filters else None
+        cached = self.__snapshot.catalog_cache.get(id, genre, skip)
+        record_cache("catalog_page", cached is not None)
+        return cached
+
+    async def get_meta(self, id: str, s_type: str, config: Optional[str]) -> dict:
+        imdb_id = id.replace("cyberflix:", "")
+        meta = self.__snapshot.full_metas.get(imdb_id)
+        record_cache("cached_metas", meta is not None)
+        if meta is None:
+            # Kept under (type, id), apart from the previews of catalog items stored under their id
+            meta = self.__meta_store.get((s_type, imdb_id))
+            record_cache("meta_store", meta is not None)
+        if meta is None:
+            meta = await self.__meta_requests.do(
+                (s_type, imdb_id),
+                lambda: self.__admission.run("meta", lambda: self.__fetch_meta(imdb_id, s_type)),
+            )
+        return {"meta": meta}
 
+    async def __fetch_meta(self, imdb_id: str, s_type: str) -> dict:
+        original_meta = await self.__provider.cinemeta.get_meta_async(id=imdb_id, s_type=s_type)
+        if original_meta is None:
+            # Cinemeta failed, the id may well exist, so the next request asks again
+            return {}
+        meta = original_meta.get("meta") or {}
+        # Ids Cinemeta does not know are remembered briefly, or every request for one would reach it again
+        self.__meta_store.set((s_type, imdb_id), meta, ttl=None if meta else env.META_NEGATIVE_TTL)
+        return meta
+
+    def get_meta_store_stats(self) -> dict:
+        return self.__meta_store.get_stats()
+
+    def get_coalescing_stats(self) -> dict:
+        stats = {}
+        for name, requests in (("catalog", self.__catalog_requests), ("meta", self.__meta_requests)):
+            stats.update({name: {"executed": requests.executed, "coalesced": requests.coalesced}})
+        return stats
+
+    def update_cache_metrics(self):
+        snapshot = self.__snapshot
+        CACHE_ENTRIES.set(len(snapshot.metas), "cached_metas")
+        CACHE_ENTRIES.set(len(self.__meta_store), "meta_store")
+        self.__meta_store.update_metrics()
+        CACHE_ENTRIES.set(len(snapshot.manifests), "manifest")
+        CACHE_ENTRIES.set(len(snapshot.catalog_cache), "catalog_page")
+
+    async def close(self):
+        await self.__provider.cinemeta.close()
+
+    async def get_configured_catalog(self, id: str, extras: Optional[str], config: Optional[UserConfig]) -> dict:
+        filters, skip = self.__get_catalog_query(extras)
+        rpdb_key = config.rpdb_key if config is not None else None
+        trakt_key = config.trakt_key if config is not None else None
+        lang_key = config.lang if config is not None else "en"
+
+        # Identical requests arriving while one is being built share its result
+        key = (id, filters, skip, *(config.key if config is not None else (None, None, "en")))
+        return await self.__catalog_requests.do(
+            key,
+            lambda: self.__admission.run(
+                "catalog",
+                lambda: asyncio.to_thread(
+                    self.__build_configured_catalog, id, filters, skip, rpdb_key, trakt_key, lang_key
+                ),
+            ),
+        )
+
+    def __get_catalog_query(self, extras: Optional[str]) -> tuple[tuple[str, ...], int]:
+        """Filters and skip of an extras segment, parsed once per distinct segment."""
+        query = self.__catalog_queries.get(extras)
+        if query is None:
+            parsed_extras = self.__extras_parser(extras)
+            query = (self.__get_filters(parsed_extras), parsed_extras.get("skip", 0))
+            self.__catalog_queries.set(extras, query)
+        return query
+
+    def __build_configured_catalog(
+        self,
+        id: str,
+        filters: tuple[str, ...],
+        skip: int,
+        rpdb_key: Optional[str],
+        trakt_key: Optional[str],
+        lang_key: str,
+    ) -> dict:
+        # Stick to the snapshot published when the request started, even if a new one lands meanwhile
+        snapshot = self.__snapshot
+        catalog_index = snapshot.catalog_indexes.get(id)
+        if catalog_index is None:
+            catalog = snapshot.catalogs.get(id) or {}
+            catalog_index = CatalogIndex(catalog.get("data") or [])
         if trakt_key is not None:
+            # The snapshot list is shared by every request, overlay the recommendations instead of extending it
             trakt_metas = self.__get_trakt_recommendations(id, trakt_key)
-            catalog_ids.extend(trakt_metas)
-
-        catalog_ids = self.__filter_meta(catalog_ids, genre, skip)
+            catalog_ids = CatalogOverlay(catalog_index, trakt_metas).page(filters, skip)
+        else:
+            catalog_ids = catalog_index.page(filters, skip)
         catalogs_ids_not_cached = []
         metas = []
         for item in catalog_ids:
             if isinstance(item, ImdbInfo):
-                meta = db_manager.cached_metas.get(item.id)
+                meta = snapshot.metas.get(item.id) or self.__meta_store.get(item.id)
                 if meta is None:
                     catalogs_ids_not_cached.append(item)
                     continue
                 metas.append(meta)
 
+        record_cache("cached_metas", True, len(metas))
+        record_cache("cached_metas", False, len(catalogs_ids_not_cached))
+        metas_by_id = index_metas(metas)
         if len(catalogs_ids_not_cached) > 0:
             keys = [item.id for item in catalogs_ids_not_cached]
-            new_metas = db_manager.get_metas_by_keys(keys)
-            metas.extend(new_metas.values())
-
-        new_cached_metas = {}
-        for meta in metas:
-            meta_id = meta.get("id") or None
-            if meta_id is None:
-                continue
-            for item in catalog_ids:
-                if isinstance(item, ImdbInfo) and item.id == meta_id:
-                    new_cached_metas.update({item.id: meta})
-                    break
-        db_manager.cached_metas.update(new_cached_metas)
+            new_metas = index_metas(get_preview_meta(meta) for meta in db_manager.get_metas_by_keys(keys).values())
+            for meta_id, meta in new_metas.items():
+                self.__meta_store.set(meta_id, meta)
+                metas_by_id.setdefault(meta_id, meta)
 
-        sorted_metas = []
-        for item in catalog_ids:
-            if not isinstance(item, ImdbInfo):
-                continue
-            for meta in metas:
-                if meta.get("id") == item.id:
-                    sorted_metas.append(meta)
-                    break
+        sorted_metas = order_metas(catalog_ids, metas_by_id)
 
         if rpdb_key is not None:
             sorted_metas = self.__rpdb_api.replace_posters(
-                metas=sorted_metas, api_key=rpdb_key, lang=lang_key or "en"
+                metas=sorted_metas, api_key=rpdb_key, lang=lang_key
             )
 
         return {
@@ -255,30 +545,22 @@ class WebWorker:
             "total": len(sorted_metas)
         }
 
-    def __filter_meta(self, items: list[ImdbInfo], genre: Optional[str], skip: int) -> list:
-        new_items = []
-        if genre is not None:
-            if genre.isnumeric():
-                for item in items:
-                    if genre != item.year:
-                        continue
-                    new_items.append(item)
-            else:
-                genre = self.__provider.cinemeta.get_simplified_genre(genre) or genre
-                for item in items:
-                    if genre not in item.genres:
-                        continue
-                    new_items.append(item)
-        else:
-            new_items = items
+    def __normalize_genre(self, genre: Optional[str]) -> Optional[str]:
+        if genre is None or genre.isnumeric():
+            return genre
+        return self.__provider.cinemeta.get_simplified_genre(genre) or genre
 
-        page_size = 25
-        min_step = min(skip + page_size, len(new_items))
-        return new_items[skip:min_step]
+    def __get_filters(self, parsed_extras: dict) -> tuple[str, ...]:
+        """Normalized genre and year filters of a request, sorted so equivalent requests share keys."""
+        filters = set()
+        for genre in (parsed_extras.get("genre"), *parsed_extras.get("genres", ())):
+            if genre:
+                filters.add(self.__normalize_genre(genre))
+        return tuple(sorted(filters))
 
     @property
     def manifest(self):
-        return db_manager.cached_manifest
+        return self.__snapshot.manifest
 
     @property
     def last_update(self) -> datetime:
@@ -322,7 +604,24 @@ class WebWorker:
             catalogs = db_manager.get_catalogs()
             if not catalogs:
                 raise ValueError("No catalogs retrieved")
-            self.__builder.build()
+
+            # Build into private copies, requests keep reading the published snapshot meanwhile
+            published = self.__snapshot
+            building_catalogs = dict(published.catalogs)
+            building_metas = published.full_metas.copy()
+            db_manager.replace_catalogs(building_catalogs)
+            db_manager.replace_metas(building_metas)
+            try:
+                self.__builder.build()
+                if not self.verify_update(building_catalogs):
+                    raise ValueError("Built catalogs failed verification, keeping the previous snapshot")
+            except Exception:
+                self.__restore_published_snapshot()
+                raise
+            # Uploading to the database reloads the cached dicts, publish what was built
+            db_manager.replace_catalogs(building_catalogs)
+            db_manager.replace_metas(building_metas)
+            self.__publish_snapshot(build_id=uuid.uuid4().hex, built_at=datetime.now())
             # Update database in smaller transactions
             chunk_size = 100
             for i in range(0, len(catalogs), chunk_size):
@@ -351,7 +650,17 @@ class WebWorker:
         while True:
             try:
                 time.sleep(self.__update_interval)
-                if not self.__perform_update_with_retries(max_retries, retry_delay):
+                if self.__leader is not None and not self.__leader.acquire():
+                    # Another worker runs the builds, serve what it publishes
+                    self.__follow_snapshot_file()
+                    self.__update_interval = env.SNAPSHOT_POLL_INTERVAL
+                    continue
+                self.__updating = True
+                try:
+                    updated = self.__perform_update_with_retries(max_retries, retry_delay)
+                finally:
+                    self.__updating = False
+                if not updated:
                     log.error("::=>[Update Failed] Scheduling earlier retry in 5 minutes")
                     time.sleep(failure_reschedule)
                     continue
@@ -363,12 +672,6 @@ class WebWorker:
     def __perform_update_with_retries(self, max_retries, retry_delay):
         for attempt in range(max_retries):
             try:
-                # Store the current state before update
-                previous_state = {
-                    "catalogs": db_manager.cached_catalogs.copy(),
-                    "metas": db_manager.cached_metas.copy()
-                }
-                
                 # Attempt the update
                 self.force_update()
                 return True
@@ -377,10 +680,9 @@ class WebWorker:
                 log.error(f"::=>[Update Failed] Error: {str(e)}")
                 
                 try:
-                    # Restore previous state in cache
-                    db_manager.cached_catalogs = previous_state["catalogs"]
-                    db_manager.cached_metas = previous_state["metas"]
-                    log.info("::=>[Recovery] Restored previous cache state")
+                    # Requests never stopped reading the published snapshot, the database copy is realigned to it
+                    self.__restore_published_snapshot()
+                    log.info(f"::=>[Recovery] Restored snapshot {self.__snapshot.generation}")
                 except Exception as restore_error:
                     log.error(f"::=>[Recovery Failed] Could not restore cache: {str(restore_error)}")
                 
@@ -394,12 +696,16 @@ class WebWorker:
         return False
 
     def __extras_parser(self, extras: Optional[str]) -> dict:
-        result = {"genre": None, "skip": 0}
+        result = {"genre": None, "genres": (), "skip": 0}
 
         if extras is not None:
             parsed_extras = extras.replace(" & ", "$").split("&")
             for value in parsed_extras:
-                if "genre" in value:
+                if value.startswith("genres="):
+                    # Intersection of several genres (and/or a year), comma separated
+                    genres = value[len("genres="):].replace("$", " & ").split(",")
+                    result.update({"genres": tuple(genre.strip() for genre in genres if genre.strip())})
+                elif "genre" in value:
                     splited_genre = value.split("=")
                     if len(splited_genre) == 1:
                         continue
@@ -412,25 +718,27 @@ class WebWorker:
 
         return result
 
-    def verify_update(self):
+    def verify_update(self, catalogs: Optional[dict] = None):
         log.info("::=>[Verify] Checking catalog updates...")
-        
+        if catalogs is None:
+            catalogs = db_manager.cached_catalogs
+
         # Check catalog counts
-        catalog_count = len(db_manager.cached_catalogs)
+        catalog_count = len(catalogs)
         if catalog_count == 0:
             log.error("::=>[Verify] No catalogs found")
             return False
         
         # Check for minimum expected catalogs
         expected_catalogs = {"netflix.popular.movie", "disney_plus.popular.movie"}
-        missing_catalogs = [cat for cat in expected_catalogs if cat not in db_manager.cached_catalogs]
+        missing_catalogs = [cat for cat in expected_catalogs if cat not in catalogs]
         if missing_catalogs:
             log.error(f"::=>[Verify] Missing essential catalogs: {missing_catalogs}")
             return False
         
         # Check catalog sizes
         small_catalogs = []
-        for key, value in db_manager.cached_catalogs.items():
+        for key, value in catalogs.items():
             data = value.get("data") or []
             if len(data) < 10:  # Arbitrary minimum size
                 small_catalogs.append(key)
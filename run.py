@@ -1,23 +1,45 @@
 import os
+from urllib.parse import quote
 
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
-from fastapi.middleware.gzip import GZipMiddleware
-from lib import env
+from lib import env, metrics
+from lib.admission import Overloaded
+from lib.cached_body import CachedBody
+from lib.profiler import ProfilerMiddleware
+from lib.responses import BufferResponse, OrjsonResponse
+from lib.static_files import PrecompressedStaticFiles, SelectiveGZipMiddleware, build_sidecars
+from lib.model.user_config import UserConfig
 from lib.web_worker import WebWorker
 from typing import Optional
 
 SERVER_VERSION = "2.0.0"
 
 worker = WebWorker()
-app = FastAPI()
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app = FastAPI(default_response_class=OrjsonResponse)
+# Static files ship sidecars and the JSON routes pick their encoding from CachedBody, each with its own ETag
+app.add_middleware(
+    SelectiveGZipMiddleware,
+    minimum_size=1000,
+    excluded_prefixes=("/static/", "/web_config.json"),
+    excluded_pattern=r"^(/c/[^/]+)?/(manifest\.json|catalog/|meta/)",
+)
+app.add_middleware(metrics.MetricsMiddleware, excluded_paths=("/metrics",))
+if env.PROFILER_SAMPLE_RATE > 0 or env.PROFILER_SECRET is not None:
+    app.add_middleware(
+        ProfilerMiddleware,
+        directory=env.PROFILER_DIR,
+        sample_rate=env.PROFILER_SAMPLE_RATE,
+        secret=env.PROFILER_SECRET,
+        interval=env.PROFILER_INTERVAL,
+    )
 
 project_dir = os.path.join(app.root_path, "web/")
-app.mount("/static", StaticFiles(directory=project_dir), name="static")
+build_sidecars(project_dir)
+static_files = PrecompressedStaticFiles(directory=project_dir)
+app.mount("/static", static_files, name="static")
 templates = Jinja2Templates(directory=project_dir)
 
 # Add a new constant for cache durations
@@ -42,17 +64,65 @@ def add_cache_headers(max_age: int) -> dict:
     }
 
 
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, error: Overloaded):
+    """Shed upstream-dependent work fast instead of letting it pile up."""
+    headers = {
+        "Retry-After": str(env.ADMISSION_RETRY_AFTER),
+        "Cache-Control": "no-store",
+        "Access-Control-Allow-Origin": "*",
+    }
+    return OrjsonResponse({"error": "Server is overloaded, retry later"}, status_code=503, headers=headers)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await worker.close()
+
+
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Check server health."""
     catalogs = worker.get_web_config().get("config", {}).get("catalogs", [])
     if catalogs == []:
-        return JSONResponse({"status": "error"}, status_code=500)
-    return JSONResponse({"status": "ok"}, status_code=200)
+        return OrjsonResponse({"status": "error"}, status_code=500)
+    return OrjsonResponse(
+        {
+            "status": "ok",
+            "coalesced_requests": worker.get_coalescing_stats(),
+            "meta_store": worker.get_meta_store_stats(),
+        },
+        status_code=200,
+    )
+
+
+@app.get("/livez", tags=["Health"])
+async def liveness_probe():
+    """Report that the process serves requests, along with the current snapshot."""
+    return OrjsonResponse({"status": "ok", "snapshot": worker.get_snapshot_info()}, status_code=200)
+
+
+@app.get("/readyz", tags=["Health"])
+async def readiness_probe():
+    """Pass only once a built, non-empty catalog snapshot is served."""
+    if not worker.is_ready():
+        return OrjsonResponse(
+            {"status": "loading", "snapshot": worker.get_snapshot_info()},
+            status_code=503,
+            headers={"Retry-After": "30"},
+        )
+    return OrjsonResponse({"status": "ok", "snapshot": worker.get_snapshot_info()}, status_code=200)
+
+
+@app.get("/metrics", tags=["Health"])
+async def metrics_exposition():
+    """Expose route, cache and upstream metrics in the Prometheus text format."""
+    worker.update_cache_metrics()
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 
 def __json_response(data: dict, extra_headers: dict[str, str] = {}, status_code: int = 200):
-    response = JSONResponse(data, status_code=status_code)
+    response = OrjsonResponse(data, status_code=status_code)
     headers = {
         "Access-Control-Allow-Origin": "*",
         "Access-Control-Allow-Headers": "*",
@@ -62,11 +132,65 @@ def __json_response(data: dict, extra_headers: dict[str, str] = {}, status_code:
     return response
 
 
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Check the request validators against a strong ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def __cached_json_response(request: Request, cached: CachedBody, extra_headers: dict[str, str] = {}):
+    body, encoding = cached.get_encoded(request.headers.get("accept-encoding"))
+    etag = cached.get_etag(encoding)
+    headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Headers": "*",
+        "ETag": etag,
+    }
+    headers.update(extra_headers)
+    if encoding is not None:
+        headers.update({"Content-Encoding": encoding})
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return BufferResponse(content=body, media_type="application/json", headers=headers)
+
+
+def __canonical_redirect(request: Request, configs: Optional[str], user_config: Optional[UserConfig]):
+    """Permanent redirect of a non-canonical `/c/{configs}/` URL, so shared caches see one URL per config."""
+    if configs is None or user_config is None or user_config.canonical == configs:
+        return None
+    prefix = f"/c/{configs}/"
+    path = request.url.path
+    if not path.startswith(prefix):
+        return None
+    # The "|" stays raw like in the URLs of the configure page, RedirectResponse would escape it
+    location = f"c/{quote(user_config.canonical, safe='=|,')}/{quote(path[len(prefix):], safe='/=&,')}"
+    if request.url.query:
+        location = f"{location}?{request.url.query}"
+    headers = {
+        "Location": f"{request.scope.get('root_path', '')}/{location}",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Headers": "*",
+    }
+    headers.update(add_cache_headers(CACHE_DURATIONS["VERY_LONG"]))
+    return Response(status_code=301, headers=headers)
+
+
+def get_catalog_max_age(id: str) -> int:
+    expiration_days = worker.get_catalog_expiration_days(id)
+    if expiration_days is None:
+        return CACHE_DURATIONS["MEDIUM"]
+    return 60 * 60 * 24 * expiration_days
+
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     cache_age = 60 * 60 * 2  # 2 hours
     headers = add_cache_headers(cache_age)
-    response = templates.TemplateResponse("index.html", {"request": request}, headers=headers)
+    context = {"request": request, "static_fingerprint": static_files.fingerprint}
+    response = templates.TemplateResponse("index.html", context, headers=headers)
     return response
 
 
@@ -120,47 +244,59 @@ async def manifest(
     request: Request,
     configs: Optional[str] = None,
 ):
+    user_config = worker.get_user_config(configs)
+    redirect = __canonical_redirect(request, configs, user_config)
+    if redirect is not None:
+        return redirect
     referer = str(request.base_url)
-    manifest = worker.get_configured_manifest(referer, configs)
-    manifest.update({"server_version": SERVER_VERSION})
+    manifest = worker.get_manifest(referer, user_config, server_version=SERVER_VERSION)
     headers = add_cache_headers(CACHE_DURATIONS["SHORT"])
-    return __json_response(manifest, extra_headers=headers)
+    return __cached_json_response(request, manifest, extra_headers=headers)
 
 
 @app.get("/web_config.json")
-async def web_config():
-    config = worker.get_web_config()
+async def web_config(request: Request):
     headers = add_cache_headers(CACHE_DURATIONS["MEDIUM"])
-    return __json_response(config, extra_headers=headers)
+    return __cached_json_response(request, worker.get_web_config_body(), extra_headers=headers)
 
 
 @app.get("/meta/{type}/{id}.json")
 @app.get("/c/{configs}/meta/{type}/{id}.json")
-async def meta(type: Optional[str], id: Optional[str], configs: Optional[str] = None):
+async def meta(request: Request, type: Optional[str], id: Optional[str], configs: Optional[str] = None):
     if id is None or type is None:
         return HTTPException(status_code=404, detail="Not found")
-    meta = worker.get_meta(id=id, s_type=type, config=configs)
+    meta = await worker.get_meta(id=id, s_type=type, config=configs)
     headers = add_cache_headers(CACHE_DURATIONS["VERY_LONG"])
-    return __json_response(meta, extra_headers=headers)
+    if not meta.get("meta"):
+        # An empty meta may come from a Cinemeta outage, don't let clients and proxies keep it
+        headers.update({"Cache-Control": "no-store"})
+    return __cached_json_response(request, CachedBody.from_data(meta), extra_headers=headers)
 
 
 @app.get("/catalog/{type}/{id}.json")
 @app.get("/catalog/{type}/{id}/{extras}.json")
-async def catalog(type: Optional[str], id: Optional[str], extras: Optional[str] = None):
-    return await catalog_with_configs(configs=None, type=type, id=id, extras=extras)
+async def catalog(request: Request, type: Optional[str], id: Optional[str], extras: Optional[str] = None):
+    return await catalog_with_configs(request, configs=None, type=type, id=id, extras=extras)
 
 
 @app.get("/c/{configs}/catalog/{type}/{id}.json")
 @app.get("/c/{configs}/catalog/{type}/{id}/{extras}.json")
 async def catalog_with_configs(
-    configs: Optional[str], type: Optional[str], id: Optional[str], extras: Optional[str] = None
+    request: Request, configs: Optional[str], type: Optional[str], id: Optional[str], extras: Optional[str] = None
 ):
     if id is None:
         return HTTPException(status_code=404, detail="Not found")
 
-    metas = await worker.get_configured_catalog(id=id, extras=extras, config=configs)
-    headers = add_cache_headers(CACHE_DURATIONS["MEDIUM"])
-    return __json_response(metas, extra_headers=headers)
+    user_config = worker.get_user_config(configs)
+    redirect = __canonical_redirect(request, configs, user_config)
+    if redirect is not None:
+        return redirect
+    headers = add_cache_headers(get_catalog_max_age(id))
+    page = worker.get_cached_catalog(id=id, extras=extras, config=user_config)
+    if page is None:
+        metas = await worker.get_configured_catalog(id=id, extras=extras, config=user_config)
+        page = CachedBody.from_data(metas)
+    return __cached_json_response(request, page, extra_headers=headers)
 
 if __name__ == "__main__":
     uvicorn.run(
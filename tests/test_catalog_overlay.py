@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from lib.catalog_cache import PAGE_SIZE
+from lib.catalog_index import CatalogIndex, CatalogOverlay, matches_filter
+from lib.model.catalog_type import CatalogType
+from lib.providers.catalog_info import ImdbInfo
+
+GENRES = ["Action", "Comedy", "Drama", "Horror", "Sci-Fi"]
+YEARS = ["2019", "2020", "2021"]
+
+
+def make_items(rng: random.Random, prefix: str, count: int) -> list[ImdbInfo]:
+    return [
+        ImdbInfo(f"tt{prefix}{index:05d}", CatalogType.MOVIES, rng.sample(GENRES, 2), rng.choice(YEARS))
+        for index in range(count)
+    ]
+
+
+def concat_then_filter(items: list, extra: list, filters: tuple[str, ...], skip: int) -> list:
+    """What the trakt path did before the overlay: extend the catalog list, then filter and slice it."""
+    combined = list(items) + list(extra)
+    if filters:
+        combined = [
+            item
+            for item in combined
+            if isinstance(item, ImdbInfo) and all(matches_filter(item, key) for key in filters)
+        ]
+    return combined[skip : skip + PAGE_SIZE]
+
+
+@pytest.fixture
+def snapshot_catalog() -> dict:
+    return {"data": make_items(random.Random(0), "1", 120)}
+
+
+def test_overlay_pages_match_concatenated_catalog(snapshot_catalog):
+    rng = random.Random(1)
+    items = snapshot_catalog["data"]
+    index = CatalogIndex(items)
+    filter_choices = [(), ("Action",), ("2020",), ("Comedy", "Drama"), ("Horror", "2021"), ("Western",)]
+    for _ in range(500):
+        extra = make_items(rng, "2", rng.randint(0, 60))
+        filters = rng.choice(filter_choices)
+        skip = rng.choice(range(0, 200, PAGE_SIZE))
+        page = CatalogOverlay(index, extra).page(filters, skip)
+        assert [item.id for item in page] == [
+            item.id for item in concat_then_filter(items, extra, filters, skip)
+        ]
+
+
+def test_overlay_leaves_snapshot_catalog_unchanged(snapshot_catalog):
+    rng = random.Random(2)
+    items = snapshot_catalog["data"]
+    ids_before = [item.id for item in items]
+    index = CatalogIndex(items)
+    for _ in range(500):
+        extra = make_items(rng, "3", 40)
+        overlay = CatalogOverlay(index, extra)
+        overlay.page(rng.choice([(), ("Drama",), ("2019",)]), rng.choice([0, 25, 100, 150]))
+        assert len(overlay) == len(ids_before) + len(extra)
+    assert snapshot_catalog["data"] is items
+    assert len(items) == len(ids_before)
+    assert [item.id for item in items] == ids_before
+    assert [item.id for item in index.items] == ids_before
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from lib.catalog_cache import PAGE_SIZE
+from lib.model.catalog_type import CatalogType
+from lib.model.user_config import UserConfig
+from lib.providers.catalog_info import ImdbInfo
+from lib.web_worker import WebWorker, db_manager
+
+CATALOG_ID = "recommendations.movie"
+ACCESS_TOKEN = "token"
+
+
+def make_meta(item: ImdbInfo) -> dict:
+    return {
+        "id": item.id,
+        "type": "movie",
+        "name": f"Title {item.id}",
+        "genres": item.genres,
+        "releaseInfo": item.year,
+        "videos": [{"id": f"{item.id}:1"}],
+    }
+
+
+SNAPSHOT_ITEMS = [
+    ImdbInfo(f"tt1{index:05d}", CatalogType.MOVIES, ["Action" if index % 2 else "Drama"], "2020")
+    for index in range(30)
+]
+TRAKT_ITEMS = [
+    ImdbInfo(f"tt2{index:05d}", CatalogType.MOVIES, ["Action" if index % 3 else "Comedy"], "2021")
+    for index in range(20)
+]
+
+
+class StubTraktProvider:
+    def __init__(self) -> None:
+        self.schemas: list[str] = []
+
+    def get_imdb_info(self, schema: str, c_type: CatalogType, **kwargs) -> list[ImdbInfo]:
+        self.schemas.append(schema)
+        return list(TRAKT_ITEMS) if c_type == CatalogType.MOVIES else []
+
+
+@pytest.fixture
+def trakt() -> StubTraktProvider:
+    return StubTraktProvider()
+
+
+@pytest.fixture
+def worker(monkeypatch, trakt) -> WebWorker:
+    # No catalog builds, the worker only serves the snapshot seeded below
+    monkeypatch.setattr(WebWorker, "_WebWorker__background_catalog_updater", lambda self: None)
+    monkeypatch.setitem(db_manager.cached_catalogs, CATALOG_ID, {"data": list(SNAPSHOT_ITEMS)})
+    for item in SNAPSHOT_ITEMS:
+        monkeypatch.setitem(db_manager.cached_metas, item.id, make_meta(item))
+    # Recommended items are missing from the snapshot, their metas come from the metas table
+    metas_by_id = {item.id: make_meta(item) for item in TRAKT_ITEMS}
+    monkeypatch.setattr(db_manager, "get_metas_by_keys", lambda keys: {key: metas_by_id[key] for key in keys})
+    worker = WebWorker()
+    monkeypatch.setitem(worker._WebWorker__builder._Builder__catalog_providers, "trakt", trakt)
+    return worker
+
+
+def get_pages(worker: WebWorker, config: UserConfig, extras: list) -> list[list[str]]:
+    async def get_all():
+        return [await worker.get_configured_catalog(CATALOG_ID, extra, config) for extra in extras]
+
+    return [[meta["id"] for meta in page["metas"]] for page in asyncio.run(get_all())]
+
+
+def test_trakt_recommendations_follow_snapshot_catalog(worker, trakt):
+    config = UserConfig.compile(f"trakt={ACCESS_TOKEN}|lang=en", ())
+    first, second, third = get_pages(worker, config, [None, f"skip={PAGE_SIZE}", f"skip={2 * PAGE_SIZE}"])
+    merged = [item.id for item in SNAPSHOT_ITEMS + TRAKT_ITEMS]
+    assert first == merged[:PAGE_SIZE]
+    assert second == merged[PAGE_SIZE : 2 * PAGE_SIZE]
+    assert third == []
+    assert all(f"access_token={ACCESS_TOKEN}" in schema for schema in trakt.schemas)
+
+    (action,) = get_pages(worker, config, ["genre=Action"])
+    assert action == [item.id for item in SNAPSHOT_ITEMS + TRAKT_ITEMS if "Action" in item.genres][:PAGE_SIZE]
+
+
+def test_trakt_recommendations_stay_out_of_snapshot(worker):
+    config = UserConfig.compile(f"trakt={ACCESS_TOKEN}|lang=en", ())
+    get_pages(worker, config, [None, f"skip={PAGE_SIZE}"])
+    assert [item.id for item in db_manager.cached_catalogs[CATALOG_ID]["data"]] == [
+        item.id for item in SNAPSHOT_ITEMS
+    ]
+    (anonymous,) = get_pages(worker, UserConfig.compile("lang=en", ()), [f"skip={PAGE_SIZE}"])
+    assert anonymous == [item.id for item in SNAPSHOT_ITEMS[PAGE_SIZE:]]
+    # Pages carry previews, episodes stay with the full metas
+    page = asyncio.run(worker.get_configured_catalog(CATALOG_ID, None, config))
+    assert all("videos" not in meta for meta in page["metas"])